@@ -0,0 +1,124 @@
+from __future__ import annotations
+import math
+from typing import Dict, List
+from data_model import ProbeResult, STATE_DEGRADED
+
+class P2Quantile:
+    """One quantile of a stream in five markers (Jain & Chlamtac's P² algorithm)."""
+    __slots__ = ("p", "n", "q", "pos", "want", "step")
+
+    def __init__(self, p: float):
+        self.p = p; self.n = 0
+        self.q: List[float] = [0.0] * 5
+        self.pos = [1, 2, 3, 4, 5]
+        self.want = [1.0, 1 + 2*p, 1 + 4*p, 3 + 2*p, 5.0]
+        self.step = [0.0, p/2, p, (1 + p)/2, 1.0]
+
+    def add(self, x: float):
+        q = self.q
+        if self.n < 5:
+            q[self.n] = x; self.n += 1
+            if self.n == 5:
+                q.sort()
+            return
+        self.n += 1
+        if x < q[0]:
+            q[0] = x; k = 0
+        elif x >= q[4]:
+            q[4] = x; k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i+1])
+        for i in range(k + 1, 5):
+            self.pos[i] += 1
+        for i in range(5):
+            self.want[i] += self.step[i]
+        for i in (1, 2, 3):
+            d = self.want[i] - self.pos[i]
+            if (d >= 1 and self.pos[i+1] - self.pos[i] > 1) or (d <= -1 and self.pos[i-1] - self.pos[i] < -1):
+                d = 1 if d > 0 else -1
+                v = self._parabolic(i, d)
+                q[i] = v if q[i-1] < v < q[i+1] else q[i] + d * (q[i+d] - q[i]) / (self.pos[i+d] - self.pos[i])
+                self.pos[i] += d
+
+    def _parabolic(self, i: int, d: int) -> float:
+        q, n = self.q, self.pos
+        return q[i] + d / (n[i+1] - n[i-1]) * ((n[i] - n[i-1] + d) * (q[i+1] - q[i]) / (n[i+1] - n[i])
+                                               + (n[i+1] - n[i] - d) * (q[i] - q[i-1]) / (n[i] - n[i-1]))
+
+    def value(self) -> float:
+        if self.n >= 5:
+            return self.q[2]
+        if not self.n:
+            return 0.0
+        s = sorted(self.q[:self.n])
+        return s[min(self.n - 1, int(round(self.p * (self.n - 1))))]
+
+class _Baseline:
+    __slots__ = ("mean", "var", "n", "p50", "p95", "spikes", "calm", "degraded")
+
+    def __init__(self):
+        self.mean = 0.0; self.var = 0.0; self.n = 0
+        self.p50 = P2Quantile(0.5); self.p95 = P2Quantile(0.95)
+        self.spikes = 0; self.calm = 0; self.degraded = False
+
+class AnomalyDetector:
+    """Flags targets whose RTT departs from their own baseline, in O(1) memory each.
+
+    Every answered probe updates an EWMA mean/variance and P² p50/p95 estimates. A
+    sample is a spike when it is ``z_threshold`` deviations above the mean and above
+    the running p95; ``trigger`` spikes in a row raise Degraded and ``clear`` samples
+    in a row within half that distance drop it. Spikes move the mean at a quarter of
+    ``alpha`` and leave the variance alone, so a lasting shift is eventually accepted
+    as the new normal without the spikes themselves widening the band.
+    """
+
+    def __init__(self, alpha: float = 0.1, z_threshold: float = 3.0, warmup: int = 20, trigger: int = 3, clear: int = 3):
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.warmup = warmup
+        self.trigger = trigger
+        self.clear = clear
+        self._state: Dict[str, _Baseline] = {}
+
+    def __len__(self) -> int:
+        return len(self._state)
+
+    def forget(self, key: str):
+        self._state.pop(key, None)
+
+    def update(self, key: str, res: ProbeResult) -> ProbeResult:
+        if res.state:
+            return res
+        b = self._state.get(key)
+        if b is None:
+            b = self._state[key] = _Baseline()
+        if not res.online:
+            b.spikes = b.calm = 0; b.degraded = False
+            return res
+        r = float(res.rtt_avg or res.ms)
+        spike = False
+        if b.n >= self.warmup:
+            # LAN RTTs barely vary; a floor keeps 1 ms -> 2 ms from counting as 10 sigma
+            z = (r - b.mean) / max(math.sqrt(b.var), 1.0, 0.1 * b.mean)
+            # Hysteresis: once Degraded, only a sample back near the mean counts as normal
+            spike = z > self.z_threshold / 2 if b.degraded else (z > self.z_threshold and r > b.p95.value())
+        if b.n == 0:
+            b.mean = r
+        elif spike:
+            b.mean += self.alpha / 4 * (r - b.mean)  # drift only; spikes must not widen the band
+        else:
+            diff = r - b.mean
+            b.mean += self.alpha * diff
+            b.var = (1 - self.alpha) * (b.var + self.alpha * diff * diff)
+        b.n += 1
+        b.p50.add(r); b.p95.add(r)
+        if spike:
+            b.spikes += 1; b.calm = 0
+            if b.spikes >= self.trigger:
+                b.degraded = True
+        else:
+            b.calm += 1; b.spikes = 0
+            if b.calm >= self.clear:
+                b.degraded = False
+        return res._replace(state=STATE_DEGRADED if b.degraded else "",
+                            p50=round(b.p50.value(), 2), p95=round(b.p95.value(), 2))
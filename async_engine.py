@@ -0,0 +1,202 @@
+from __future__ import annotations
+import asyncio, time
+from typing import List, Optional, Set, Tuple
+from data_model import DeviceJob, ProbeResult
+from engine import BurstStats, ProbeEngine, _ping_cmd, _parse_ping, _parse_burst, as_result
+from icmp_echo import get_icmp_socket
+from ping_coproc import PingCoprocesses
+from port_probe import get_port_prober, parse_probe
+from resolver import get_resolver, is_address
+
+async def ping_async(ip: str, timeout_ms: int = 1000) -> Tuple[bool, int]:
+    cmd, encoding, creationflags = _ping_cmd(ip, timeout_ms)
+    t0 = time.perf_counter()
+    try:
+        proc = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                                                    creationflags=creationflags)
+    except Exception:
+        return False, 0
+    try:
+        out, err = await asyncio.wait_for(proc.communicate(), timeout=timeout_ms/1000.0 + 1.0)
+    except asyncio.TimeoutError:
+        return False, 0
+    finally:
+        if proc.returncode is None:
+            try: proc.kill()
+            except ProcessLookupError: pass
+    elapsed_ms = int((time.perf_counter() - t0)*1000)
+    txt = out.decode(encoding, errors="ignore") + "\n" + err.decode(encoding, errors="ignore")
+    return _parse_ping(proc.returncode, txt, elapsed_ms)
+
+async def probe_async(ip: str, timeout_ms: int = 1000, native: bool = True, probe: str = "icmp",
+                      coproc: Optional[PingCoprocesses] = None, interval_s: float = 30.0) -> Tuple[bool, int]:
+    kind, port = parse_probe(probe)
+    if kind != "icmp":
+        return await asyncio.wrap_future(get_port_prober().submit(ip, kind, port, timeout_ms))
+    icmp = get_icmp_socket() if native else None
+    if icmp is not None and icmp.supports(ip):
+        return await asyncio.wrap_future(icmp.submit(ip, timeout_ms))
+    fut = coproc.submit(ip, interval_s, timeout_ms) if coproc is not None else None
+    if fut is not None:
+        return await asyncio.wrap_future(fut)
+    return await ping_async(ip, timeout_ms)
+
+async def ping_burst_async(ip: str, count: int, timeout_ms: int = 1000, gap_ms: int = 200) -> BurstStats:
+    cmd, encoding, creationflags = _ping_cmd(ip, timeout_ms, count, gap_ms)
+    try:
+        proc = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                                                    creationflags=creationflags)
+    except Exception:
+        return _parse_burst("", count)
+    try:
+        out, err = await asyncio.wait_for(proc.communicate(), timeout=count * (max(200, gap_ms) + timeout_ms)/1000.0 + 1.0)
+    except asyncio.TimeoutError:
+        return _parse_burst("", count)
+    finally:
+        if proc.returncode is None:
+            try: proc.kill()
+            except ProcessLookupError: pass
+    return _parse_burst(out.decode(encoding, errors="ignore") + "\n" + err.decode(encoding, errors="ignore"), count)
+
+async def burst_async(ip: str, count: int, timeout_ms: int = 1000, gap_ms: int = 200, native: bool = True,
+                      probe: str = "icmp") -> BurstStats:
+    kind, _port = parse_probe(probe)
+    icmp = get_icmp_socket() if native and kind == "icmp" else None
+    if kind == "icmp" and (icmp is None or not icmp.supports(ip)):
+        return await ping_burst_async(ip, count, timeout_ms, gap_ms)
+    stats = BurstStats()
+    for i in range(count):
+        if i:
+            await asyncio.sleep(gap_ms/1000.0)
+        stats.add(*await probe_async(ip, timeout_ms, native, probe))
+    return stats
+
+class AsyncProbeEngine(ProbeEngine):
+    """ProbeEngine variant that drives every job from one asyncio event loop.
+
+    The loop sleeps until the scheduler's next deadline and starts one probe task per
+    due job, so idle devices cost a heap entry instead of a thread; ``max_in_flight``
+    bounds the number of concurrent probes.
+    """
+
+    default_max_in_flight = 256
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._awake: asyncio.Event | None = None
+        self._probes: Set[asyncio.Task] = set()
+
+    def set_jobs(self, jobs: List[DeviceJob]):
+        with self._lock:
+            self._jobs = {j.device_id: j for j in jobs}
+            keys = self._targets.set_jobs(jobs)
+        self._in_loop(self._apply_targets, keys)
+
+    def update_job(self, job: DeviceJob):
+        with self._lock:
+            self._jobs[job.device_id] = job
+            keys = self._targets.upsert(job)
+        self._in_loop(self._apply_targets, keys)
+
+    def remove_job(self, device_id: str):
+        with self._lock:
+            self._jobs.pop(device_id, None)
+            keys = self._targets.remove(device_id)
+        self._in_loop(self._apply_targets, keys)
+
+    def set_parent_state(self, parent_id: str, down: bool):
+        with self._lock:
+            (self._external_down.add if down else self._external_down.discard)(parent_id)
+        self._in_loop(lambda: self._sched.set_parent_state(parent_id, down))
+
+    def stop(self):
+        self._running = False
+        self._call_soon(self._poke)
+
+    def run(self):
+        self._running = True
+        try:
+            asyncio.run(self._main())
+        finally:
+            self._loop = None
+
+    def _call_soon(self, fn):
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            try: loop.call_soon_threadsafe(fn)
+            except RuntimeError: pass
+
+    def _in_loop(self, fn, *args):
+        """Apply a scheduler change on the loop thread, which owns the scheduler."""
+        def call():
+            if self._sched is not None:
+                with self._lock: fn(*args)
+            self._poke()
+        self._call_soon(call)
+
+    def _notify(self):
+        self._poke()
+
+    def _poke(self):
+        if self._awake is not None:
+            self._awake.set()
+
+    async def _main(self):
+        self._awake = asyncio.Event()
+        # Loop first: an edit racing with startup is then queued and replayed on the new scheduler
+        self._loop = asyncio.get_running_loop()
+        with self._lock:
+            self._sched = self._new_scheduler()
+        self._coproc = self._new_coprocesses()
+        try:
+            while self._running:
+                self._awake.clear()
+                free = self.max_in_flight - self._sched.in_flight
+                for job in (self._sched.pop_due(limit=free) if free > 0 else []):
+                    task = asyncio.create_task(self._probe(job, self._sched.timeout_ms(job)))
+                    self._probes.add(task); task.add_done_callback(self._probes.discard)
+                nxt = self._sched.next_due() if self._sched.in_flight < self.max_in_flight else None
+                for key in self._sched.take_unreachable():
+                    with self._lock: members = self._targets.members(key)
+                    for device_id in members:
+                        self._publish(ProbeResult.unreachable(device_id))
+                flush_at = self._flush_batch()
+                wake_at = min((d for d in (nxt, flush_at) if d is not None), default=None)
+                timeout = None if wake_at is None else max(0.0, wake_at - time.monotonic())
+                try:
+                    await asyncio.wait_for(self._awake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            probes = list(self._probes)
+            for t in probes: t.cancel()
+            await asyncio.gather(*probes, return_exceptions=True)
+            if self._coproc is not None:
+                self._coproc.close(); self._coproc = None
+            self._sched = None
+            self._flush_batch(force=True)  # deliver what was probed before the stop
+
+    async def _probe(self, job: DeviceJob, timeout_ms: int = 1000):
+        try:
+            addr = job.ip if is_address(job.ip) else await asyncio.wrap_future(get_resolver().resolve(job.ip))
+            if addr is None:
+                value = (False, 0)
+            elif job.packets > 1:
+                value = await burst_async(addr, job.packets, timeout_ms, self.burst_gap_ms, self.native_icmp, job.probe)
+            else:
+                value = await probe_async(addr, timeout_ms=timeout_ms, native=self.native_icmp, probe=job.probe,
+                                          coproc=self._coproc, interval_s=job.interval)
+            res = as_result(job.device_id, value)
+        except Exception:
+            res = ProbeResult.single(job.device_id, False, 0)
+        raw = res
+        res = self.damper.update(job.device_id, self.anomaly.update(job.device_id, res))
+        report = self._sched is not None and self._sched.complete(job, raw.online, raw.ms, up=res.online)
+        self._poke()
+        if not report or not self._running:
+            return
+        with self._lock:
+            members = self._targets.members(job.device_id)
+        for device_id in members:
+            self._publish(res._replace(device_id=device_id))
@@ -0,0 +1,132 @@
+from __future__ import annotations
+import itertools, time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Set, Tuple
+from resolver import get_resolver
+from scheduler import subnet_of
+
+class Change(NamedTuple):
+    device_id: str
+    online: bool
+    keys: Tuple[str, ...]
+    at: float
+    data: Any = None  # whatever the caller needs to notify later (e.g. the ProbeResult)
+
+@dataclass
+class Incident:
+    id: int
+    key: str
+    opened: float  # wall clock
+    members: List[str] = field(default_factory=list)
+    down: Set[str] = field(default_factory=set)
+    closed: Optional[float] = None
+    last_join: float = 0.0  # monotonic; outages join only within window_s of the previous one
+
+def incident_keys(ip: str, group: str, division: str) -> Tuple[str, ...]:
+    """Correlation keys of a device: its subnet first, then its group/division."""
+    return (subnet_of(get_resolver().cached(ip) or ip), f"{group} / {division}" if division else group)
+
+class IncidentCorrelator:
+    """Folds near-simultaneous outages sharing a subnet or group/division into incidents.
+
+    Callers ``add`` each confirmed state change and ``poll`` regularly. A change is held
+    for ``hold_s`` before it is released as a ``("device", Change)`` event. When
+    ``min_members`` devices of one key have gone down within ``window_s``, an
+    ``("open", Incident)`` event replaces their held notifications. Further outages of
+    that key within ``window_s`` of the last one join the incident silently; after that
+    the incident is settled: new outages are reported on their own again, and only its
+    members' recoveries stay folded into it. ``("close", Incident)`` follows once every
+    member is back. ``min_members=0``
+    turns correlation off: every change is released on the next poll.
+    """
+
+    def __init__(self, window_s: float = 60.0, hold_s: float = 5.0, min_members: int = 3, clock=time.monotonic):
+        self.window_s = window_s
+        self.min_members = max(2, int(min_members)) if min_members > 0 else 0
+        self.hold_s = hold_s if self.min_members else 0.0
+        self.clock = clock
+        self._ids = itertools.count(1)
+        self._recent: Dict[str, Deque[Tuple[float, str]]] = {}  # key -> (at, device_id) outages in the window
+        self._pending: Deque[Change] = deque()
+        self._down: Set[str] = set()
+        self._open: Dict[str, Incident] = {}  # key -> incident still taking new members
+        self._unresolved: Dict[int, Incident] = {}
+        self._incident_of: Dict[str, Incident] = {}
+        self._closed: List[Incident] = []
+
+    @property
+    def open_incidents(self) -> List[Incident]:
+        return list(self._unresolved.values())
+
+    def add(self, device_id: str, online: bool, keys: Tuple[str, ...], data: Any = None, now: Optional[float] = None):
+        now = self.clock() if now is None else now
+        if online:
+            self._down.discard(device_id)
+            inc = self._incident_of.pop(device_id, None)
+            if inc is not None:
+                inc.down.discard(device_id)
+                if not inc.down:
+                    self._close(inc)
+                return
+        else:
+            self._down.add(device_id)
+            self._settle(now)
+            inc = next((self._open[k] for k in keys if k in self._open), None)
+            if inc is not None:
+                self._join(inc, device_id, now); return
+            for k in keys if self.min_members else ():
+                self._recent.setdefault(k, deque()).append((now, device_id))
+        self._pending.append(Change(device_id, online, tuple(keys), now, data))
+
+    def forget(self, device_id: str):
+        """Drop a deleted device so it cannot hold an incident open."""
+        self.add(device_id, True, ())
+        self._pending = deque(c for c in self._pending if c.device_id != device_id)
+
+    def poll(self, now: Optional[float] = None) -> List[Tuple[str, Any]]:
+        now = self.clock() if now is None else now
+        events: List[Tuple[str, Any]] = []
+        self._settle(now)
+        for key in list(self._recent):
+            q = self._recent[key]
+            while q and q[0][0] < now - self.window_s:
+                q.popleft()
+            if not q:
+                del self._recent[key]; continue
+            members = list(dict.fromkeys(d for _, d in q if d in self._down and d not in self._incident_of))
+            if key not in self._open and len(members) >= self.min_members:
+                inc = self._open[key] = Incident(next(self._ids), key, time.time())
+                self._unresolved[inc.id] = inc
+                for d in members:
+                    self._join(inc, d, now)
+                del self._recent[key]
+                events.append(("open", inc))
+        events += [("close", inc) for inc in self._closed]; self._closed = []
+        while self._pending and self._pending[0].at <= now - self.hold_s:
+            c = self._pending.popleft()
+            if not (c.device_id in self._incident_of and not c.online):
+                events.append(("device", c))
+        if self._incident_of:  # held outages that an incident absorbed are never released
+            self._pending = deque(c for c in self._pending if c.online or c.device_id not in self._incident_of)
+        return events
+
+    def _settle(self, now: float):
+        """Stop feeding incidents whose last outage is older than the window."""
+        for key in [k for k, inc in self._open.items() if now - inc.last_join > self.window_s]:
+            del self._open[key]
+
+    def _join(self, inc: Incident, device_id: str, now: float):
+        inc.last_join = now
+        if device_id not in inc.down:
+            if device_id not in inc.members:
+                inc.members.append(device_id)
+            inc.down.add(device_id)
+        self._incident_of[device_id] = inc
+
+    def _close(self, inc: Incident):
+        inc.closed = time.time()
+        if self._open.get(inc.key) is inc:
+            del self._open[inc.key]
+        self._unresolved.pop(inc.id, None)
+        self._closed.append(inc)
@@ -0,0 +1,69 @@
+from __future__ import annotations
+import time
+from typing import Dict, Optional
+from data_model import ProbeResult, STATE_FLAPPING, STATE_UNREACHABLE
+
+class _Damp:
+    __slots__ = ("committed", "last_raw", "streak", "penalty", "stamp", "suppressed")
+
+    def __init__(self, raw: bool, now: float):
+        self.committed = raw; self.last_raw = raw; self.streak = 1
+        self.penalty = 0.0; self.stamp = now; self.suppressed = False
+
+class FlapDamper:
+    """Turns raw probe answers into a committed online state, per target.
+
+    Hysteresis: the committed state changes only after ``fail_threshold`` failures
+    (or ``ok_threshold`` successes) in a row. Damping, as in BGP route-flap damping:
+    every raw up/down transition adds ``penalty``, which halves every ``half_life_s``.
+    Above ``suppress`` the target is Flapping and its committed state is frozen, so
+    flips produce no events, until the penalty decays below ``reuse``.
+    """
+
+    def __init__(self, fail_threshold: int = 2, ok_threshold: int = 1, penalty: float = 1000.0,
+                 suppress: float = 3000.0, reuse: float = 750.0, half_life_s: float = 300.0,
+                 max_penalty: float = 12000.0, clock=time.monotonic):
+        self.fail_threshold = max(1, int(fail_threshold))
+        self.ok_threshold = max(1, int(ok_threshold))
+        self.penalty = penalty
+        self.suppress = suppress
+        self.reuse = reuse
+        self.half_life_s = half_life_s
+        self.max_penalty = max_penalty
+        self.clock = clock
+        self._state: Dict[str, _Damp] = {}
+
+    def __len__(self) -> int:
+        return len(self._state)
+
+    def forget(self, key: str):
+        self._state.pop(key, None)
+
+    def committed(self, key: str) -> Optional[bool]:
+        d = self._state.get(key)
+        return None if d is None else d.committed
+
+    def update(self, key: str, res: ProbeResult, now: Optional[float] = None) -> ProbeResult:
+        if res.state == STATE_UNREACHABLE:
+            return res
+        now = self.clock() if now is None else now
+        raw = res.online
+        d = self._state.get(key)
+        if d is None:
+            self._state[key] = _Damp(raw, now)
+            return res  # first answer is taken as is
+        d.penalty *= 0.5 ** ((now - d.stamp) / self.half_life_s); d.stamp = now
+        if raw != d.last_raw:
+            d.penalty = min(self.max_penalty, d.penalty + self.penalty); d.streak = 0
+        d.last_raw = raw; d.streak += 1
+        if d.suppressed:
+            d.suppressed = d.penalty >= self.reuse
+        else:
+            d.suppressed = d.penalty >= self.suppress
+        if not d.suppressed and raw != d.committed and d.streak >= (self.ok_threshold if raw else self.fail_threshold):
+            d.committed = raw
+        if d.suppressed:
+            return res._replace(online=d.committed, state=STATE_FLAPPING)
+        if raw != d.committed:
+            return res._replace(online=d.committed, state="")  # not confirmed yet: keep reporting the old state
+        return res
@@ -1,5 +1,14 @@
 from __future__ import annotations
-from dataclasses import dataclass
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, NamedTuple
+
+STATE_UNREACHABLE = "unreachable"  # parent gateway is down, the device itself was not probed
+STATE_DEGRADED = "degraded"  # online, but RTT well above its own baseline
+STATE_FLAPPING = "flapping"  # state changes damped; online holds the last committed answer
+
+def new_device_id() -> str:
+    return uuid.uuid4().hex
 
 @dataclass
 class Device:
@@ -11,3 +20,103 @@ class Device:
     alert: bool = False
     online: bool = False
     last_ms: int = 0
+    probe: str = "icmp"  # "icmp", "tcp:<port>" or "udp:<port>"
+    id: str = field(default_factory=new_device_id)  # stable across edits/deletes, unlike the table row
+    packets: int = 1  # echo requests per cycle; >1 measures loss/jitter
+    loss: float = 0.0
+    jitter: float = 0.0
+    rtt_min: float = 0.0
+    rtt_avg: float = 0.0
+    rtt_max: float = 0.0
+    gateway: bool = False  # default parent for its group/division
+    parent: str = ""  # explicit parent device id; "" = derive from the hierarchy
+    state: str = ""  # "", STATE_UNREACHABLE, STATE_DEGRADED or STATE_FLAPPING
+    p50: float = 0.0
+    p95: float = 0.0
+
+@dataclass
+class DeviceJob:
+    device_id: str
+    ip: str
+    interval: int = 30
+    probe: str = "icmp"
+    packets: int = 1
+    parent: str = ""
+    group: str = ""  # fairness lane in the scheduler
+    alert: bool = False
+
+class ProbeResult(NamedTuple):
+    """One probe cycle for a device; compact enough to batch across threads and processes."""
+    device_id: str
+    online: bool
+    ms: int
+    loss: float = 0.0  # percent
+    jitter: float = 0.0
+    rtt_min: float = 0.0
+    rtt_avg: float = 0.0
+    rtt_max: float = 0.0
+    state: str = ""
+    p50: float = 0.0
+    p95: float = 0.0
+
+    @classmethod
+    def single(cls, device_id: str, online: bool, ms: int) -> "ProbeResult":
+        return cls(device_id, online, ms, 0.0 if online else 100.0, 0.0, ms, ms, ms)
+
+    @classmethod
+    def unreachable(cls, device_id: str) -> "ProbeResult":
+        return cls(device_id, False, 0, state=STATE_UNREACHABLE)
+
+def resolve_parents(devices: List[Device]) -> Dict[str, str]:
+    """device id -> parent id ("" for none).
+
+    An explicit ``parent`` wins. Otherwise a device hangs off the gateway of its
+    group/division, falling back to the group's gateway without a division; a division
+    gateway hangs off that group gateway. Links that would form a cycle are dropped.
+    """
+    ids = {d.id for d in devices}
+    gateways: Dict[tuple, str] = {}
+    for d in devices:
+        if d.gateway:
+            gateways.setdefault((d.group, d.division), d.id)
+    parents: Dict[str, str] = {}
+    for d in devices:
+        if d.parent:
+            p = d.parent if d.parent in ids else ""
+        elif d.gateway:
+            p = gateways.get((d.group, ""), "") if d.division else ""
+        else:
+            p = gateways.get((d.group, d.division)) or gateways.get((d.group, ""), "")
+        parents[d.id] = "" if p == d.id else p
+    for start in parents:
+        seen, cur = set(), parents[start]
+        while cur and cur not in seen and cur != start:
+            seen.add(cur); cur = parents.get(cur, "")
+        if cur == start:
+            parents[start] = ""
+    return parents
+
+def job_for(d: Device, parent: str = "") -> DeviceJob:
+    return DeviceJob(device_id=d.id, ip=d.ip, interval=max(1, d.interval), probe=d.probe, packets=max(1, d.packets),
+                     parent=parent, group=d.group, alert=d.alert)
+
+def jobs_for(devices: List[Device]) -> List[DeviceJob]:
+    parents = resolve_parents(devices)
+    return [job_for(d, parents[d.id]) for d in devices]
+
+def apply_result(d: Device, r: ProbeResult) -> bool:
+    """Copy a probe result onto the device; True when its online state flipped.
+
+    An unreachable result only sets ``state``: ``online`` keeps the last real answer,
+    so a child that comes back after its gateway does not count as a change.
+    """
+    d.state = r.state
+    if r.state == STATE_UNREACHABLE:
+        return False
+    was_online = d.online
+    d.online = r.online; d.last_ms = r.ms if r.online and r.ms else d.last_ms
+    d.loss = r.loss; d.jitter = r.jitter
+    d.rtt_min, d.rtt_avg, d.rtt_max = r.rtt_min, r.rtt_avg, r.rtt_max
+    if r.p50:
+        d.p50, d.p95 = r.p50, r.p95
+    return was_online != r.online
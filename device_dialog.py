@@ -1,16 +1,24 @@
 from __future__ import annotations
-import ipaddress
-from typing import Optional, List
+import ipaddress, re
+from typing import Optional, List, Tuple
 from PyQt6.QtWidgets import (
     QDialog, QVBoxLayout, QLabel, QComboBox, QLineEdit,
     QSpinBox, QCheckBox, QHBoxLayout, QPushButton, QMessageBox
 )
 from translations import tr
 from app_lists import DEFAULT_GROUPS, DEFAULT_DIVISIONS
+from port_probe import PROBE_TYPES, parse_probe, format_probe
+
+_HOST_LABEL = re.compile(r"^(?!-)[A-Za-z0-9-]{1,63}(?<!-)$")
+
+def is_hostname(text: str) -> bool:
+    """RFC 1123 host name; resolved later by the shared resolver cache, not here."""
+    name = text[:-1] if text.endswith(".") else text
+    return 0 < len(name) <= 253 and not name.replace(".", "").isdigit() and all(_HOST_LABEL.match(p) for p in name.split("."))
 
 class DeviceDialog(QDialog):
     def __init__(self, groups: Optional[List[str]] = None, parent=None, device_data: Optional[dict] = None,
-                 prefill_ip: Optional[str] = None):
+                 prefill_ip: Optional[str] = None, parents: Optional[List[Tuple[str, str]]] = None):
         super().__init__(parent)
         self.setWindowTitle(tr("device_add_edit_title"))
         self.resize(420, 360)
@@ -31,14 +39,34 @@ class DeviceDialog(QDialog):
         self.edit_name = QLineEdit(self); layout.addWidget(self.edit_name)
 
         layout.addWidget(QLabel(tr("ip_label")))
-        self.edit_ip = QLineEdit(self); self.edit_ip.setPlaceholderText("192.168.1.1"); layout.addWidget(self.edit_ip)
+        self.edit_ip = QLineEdit(self); self.edit_ip.setPlaceholderText("192.168.1.1 / nvr.example.local"); layout.addWidget(self.edit_ip)
 
         layout.addWidget(QLabel(tr("interval_label")))
         self.spin_interval = QSpinBox(self); self.spin_interval.setRange(1, 3600); self.spin_interval.setValue(30)
         layout.addWidget(self.spin_interval)
 
+        layout.addWidget(QLabel(tr("probe_label")))
+        probe_row = QHBoxLayout()
+        self.combo_probe = QComboBox(self); self.combo_probe.addItems(PROBE_TYPES); probe_row.addWidget(self.combo_probe, 1)
+        probe_row.addWidget(QLabel(tr("port_label")))
+        self.spin_port = QSpinBox(self); self.spin_port.setRange(1, 65535); self.spin_port.setValue(554); probe_row.addWidget(self.spin_port)
+        layout.addLayout(probe_row)
+        self.combo_probe.currentTextChanged.connect(lambda k: self.spin_port.setEnabled(k != "icmp")); self.spin_port.setEnabled(False)
+
+        layout.addWidget(QLabel(tr("packets_label")))
+        self.spin_packets = QSpinBox(self); self.spin_packets.setRange(1, 20); self.spin_packets.setValue(1)
+        layout.addWidget(self.spin_packets)
+
         self.check_alert = QCheckBox(tr("audio_alert_label")); layout.addWidget(self.check_alert)
 
+        # parents: (device id, label) of the other devices this one may sit behind
+        layout.addWidget(QLabel(tr("parent_label")))
+        self.combo_parent = QComboBox(self); self.combo_parent.addItem(tr("parent_auto"), "")
+        for pid, label in parents or []:
+            self.combo_parent.addItem(label, pid)
+        layout.addWidget(self.combo_parent)
+        self.check_gateway = QCheckBox(tr("gateway_label")); layout.addWidget(self.check_gateway)
+
         btns = QHBoxLayout()
         self.btn_ok = QPushButton(tr("ok")); self.btn_cancel = QPushButton(tr("cancel"))
         btns.addWidget(self.btn_ok); btns.addWidget(self.btn_cancel); layout.addLayout(btns)
@@ -52,6 +80,14 @@ class DeviceDialog(QDialog):
             try: self.spin_interval.setValue(int(device_data.get("interval",30)))
             except Exception: pass
             self.check_alert.setChecked(bool(device_data.get("alert", False)))
+            kind, port = parse_probe(str(device_data.get("probe", "icmp")))
+            self.combo_probe.setCurrentText(kind)
+            if port: self.spin_port.setValue(port)
+            try: self.spin_packets.setValue(int(device_data.get("packets", 1)))
+            except Exception: pass
+            self.check_gateway.setChecked(bool(device_data.get("gateway", False)))
+            i = self.combo_parent.findData(str(device_data.get("parent", "")))
+            if i >= 0: self.combo_parent.setCurrentIndex(i)
 
         if prefill_ip:
             self.edit_ip.setText(prefill_ip)
@@ -61,7 +97,8 @@ class DeviceDialog(QDialog):
         try:
             ipaddress.ip_address(ip_text)
         except Exception:
-            QMessageBox.critical(self, tr("error"), tr("enter_valid_ip")); return
+            if not is_hostname(ip_text):
+                QMessageBox.critical(self, tr("error"), tr("enter_valid_ip")); return
         if not self.edit_name.text().strip():
             QMessageBox.warning(self, tr("warning"), tr("enter_device_name")); return
         self.accept()
@@ -74,4 +111,8 @@ class DeviceDialog(QDialog):
             "ip": self.edit_ip.text().strip(),
             "interval": int(self.spin_interval.value()),
             "alert": bool(self.check_alert.isChecked()),
+            "probe": format_probe(self.combo_probe.currentText(), int(self.spin_port.value())),
+            "packets": int(self.spin_packets.value()),
+            "gateway": bool(self.check_gateway.isChecked()),
+            "parent": str(self.combo_parent.currentData() or ""),
         }
@@ -0,0 +1,361 @@
+from __future__ import annotations
+from typing import Callable, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import replace
+from functools import partial
+import subprocess, sys, time, re, threading
+from icmp_echo import get_icmp_socket
+from port_probe import get_port_prober, parse_probe
+from data_model import DeviceJob, ProbeResult
+from scheduler import ProbeScheduler
+from targets import TargetTable
+from anomaly import AnomalyDetector
+from damping import FlapDamper
+from resolver import get_resolver, is_address
+
+_ANY_MS = re.compile(r'([<]?\d+(?:[.,]\d+)?)\s*(?:ms|мс)', re.IGNORECASE)
+
+def _ping_cmd(ip: str, timeout_ms: int, count: int = 1, gap_ms: int = 200) -> Tuple[List[str], str, int]:
+    if sys.platform.startswith("win"):  # Windows ping has a fixed 1 s gap
+        return ["ping", "-n", str(count), "-w", str(timeout_ms), ip], "mbcs", 0x08000000  # CREATE_NO_WINDOW
+    wait_s = max(1, int(timeout_ms/1000))
+    if count <= 1:
+        return ["ping", "-c", "1", "-W", str(wait_s), ip], "utf-8", 0
+    # Unprivileged ping refuses intervals below 0.2 s
+    return ["ping", "-c", str(count), "-i", f"{max(200, gap_ms)/1000:.1f}", "-W", str(wait_s), ip], "utf-8", 0
+
+def _parse_ping(returncode: int, txt: str, elapsed_ms: int) -> Tuple[bool, int]:
+    low = txt.lower()
+    ok = (returncode == 0) or ("ttl=" in low) or ("bytes=" in low) or ("time=" in low) or ("время=" in low)
+    ms = 0
+    m = _ANY_MS.search(txt)
+    if m:
+        try:
+            v = m.group(1).replace(",", ".").lstrip("<")
+            ms = int(float(v))
+        except Exception:
+            ms = 0
+    if ok and ms == 0:
+        ms = elapsed_ms if elapsed_ms > 0 else 1
+    return ok, (ms if ok else 0)
+
+def ping_once(ip: str, timeout_ms: int = 1000) -> Tuple[bool, int]:
+    cmd, encoding, creationflags = _ping_cmd(ip, timeout_ms)
+    t0 = time.perf_counter()
+    try:
+        out = subprocess.run(cmd, capture_output=True, text=True, encoding=encoding, errors="ignore",
+                             timeout=timeout_ms/1000.0 + 1.0, creationflags=creationflags)
+    except Exception:
+        return False, 0
+    elapsed_ms = int((time.perf_counter() - t0)*1000)
+    txt = (out.stdout or "") + "\n" + (out.stderr or "")
+    return _parse_ping(out.returncode, txt, elapsed_ms)
+
+class BurstStats:
+    """Loss, jitter and min/avg/max over one burst of probes, in constant memory.
+
+    Jitter is the mean absolute difference between consecutive replies (RFC 3550 style).
+    """
+    __slots__ = ("sent", "received", "rtt_min", "rtt_max", "_sum", "_jitter_sum", "_last")
+
+    def __init__(self):
+        self.sent = 0; self.received = 0
+        self.rtt_min = 0.0; self.rtt_max = 0.0
+        self._sum = 0.0; self._jitter_sum = 0.0; self._last: float | None = None
+
+    def add(self, ok: bool, ms: float = 0):
+        self.sent += 1
+        if not ok:
+            return
+        r = float(max(1, ms))
+        if self.received:
+            self.rtt_min = min(self.rtt_min, r); self.rtt_max = max(self.rtt_max, r)
+        else:
+            self.rtt_min = self.rtt_max = r
+        if self._last is not None:
+            self._jitter_sum += abs(r - self._last)
+        self._last = r; self._sum += r; self.received += 1
+
+    def result(self, device_id: str) -> ProbeResult:
+        if not self.received:
+            return ProbeResult(device_id, False, 0, 100.0)
+        avg = self._sum / self.received
+        jitter = self._jitter_sum / (self.received - 1) if self.received > 1 else 0.0
+        loss = 100.0 * (self.sent - self.received) / self.sent
+        return ProbeResult(device_id, True, max(1, int(round(avg))), round(loss, 1), round(jitter, 2),
+                           self.rtt_min, round(avg, 2), self.rtt_max)
+
+def _parse_burst(txt: str, count: int) -> BurstStats:
+    """Per-reply RTTs from ``ping -c N`` output; the summary lines have no ``ttl``."""
+    stats = BurstStats()
+    for line in txt.splitlines():
+        if "ttl" not in line.lower() or stats.received >= count:
+            continue
+        m = _ANY_MS.search(line)
+        try:
+            ms = float(m.group(1).replace(",", ".").lstrip("<")) if m else 1.0
+        except ValueError:
+            ms = 1.0
+        stats.add(True, ms)
+    for _ in range(count - stats.sent):
+        stats.add(False)
+    return stats
+
+def ping_burst(ip: str, count: int, timeout_ms: int = 1000, gap_ms: int = 200) -> BurstStats:
+    cmd, encoding, creationflags = _ping_cmd(ip, timeout_ms, count, gap_ms)
+    try:
+        out = subprocess.run(cmd, capture_output=True, text=True, encoding=encoding, errors="ignore",
+                             timeout=count * (max(200, gap_ms) + timeout_ms)/1000.0 + 1.0, creationflags=creationflags)
+    except Exception:
+        return _parse_burst("", count)
+    return _parse_burst((out.stdout or "") + "\n" + (out.stderr or ""), count)
+
+def as_result(device_id: str, value) -> ProbeResult:
+    """Normalise a probe future's value: ``(online, ms)`` for one packet, ``BurstStats`` for a burst."""
+    if isinstance(value, BurstStats):
+        return value.result(device_id)
+    online, ms = value
+    return ProbeResult.single(device_id, online, ms)
+
+class ProbeEngine:
+    """Qt-free monitoring loop: schedules jobs, runs probes and reports results.
+
+    ``run()`` blocks until ``stop()``; results go to ``on_batch(list)`` as
+    ``ProbeResult`` tuples at most once per ``batch_ms``, or to ``on_result(result)``
+    per probe when ``batch_ms <= 0``. Devices that probe the same target (see
+    ``targets.target_key``) share one probe and each get its result, after the
+    anomaly detector and the flap damper have had their say. Children parked behind a down parent are reported
+    once as ``ProbeResult.unreachable`` and not probed until it recovers. Jobs with ``packets > 1`` send a burst spaced
+    ``burst_gap_ms`` apart each cycle and report loss, jitter and min/avg/max RTT.
+    The job-editing methods are safe to call from any thread.
+    """
+    default_max_in_flight = 32
+
+    def __init__(self, jobs: List[DeviceJob] | None = None, max_in_flight: int | None = None, batch_ms: int = 200,
+                 on_batch: Optional[Callable[[list], None]] = None,
+                 on_result: Optional[Callable[[ProbeResult], None]] = None):
+        self.on_batch = on_batch
+        self.on_result = on_result
+        self._jobs: Dict[str, DeviceJob] = {j.device_id: j for j in jobs} if jobs else {}
+        # Devices probing the same target share one scheduler job and one probe
+        self._targets = TargetTable()
+        self._targets.set_jobs(list(self._jobs.values()))
+        self.anomaly = AnomalyDetector()  # per target; marks results Degraded
+        # FlapDamper keyword options (hysteresis, penalty half-life), e.g. {"fail_threshold": 3}
+        self.damping_options: dict = {}
+        self.damper = FlapDamper()
+        self._running = False
+        # Bitta o'lik host (~2 s) qolganlarini kechiktirmasligi uchun probe'lar pool'da parallel ishlaydi
+        self.max_in_flight = max(1, int(max_in_flight or self.default_max_in_flight))
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._sched: ProbeScheduler | None = None
+        # ProbeScheduler keyword options (timeouts, backoff, rate budget), e.g. {"max_backoff_s": 600, "rate_limit": 50}
+        self.sched_options: dict = {}
+        self.native_icmp = True  # own ICMP socket when permitted, ping_once otherwise
+        self.ping_coprocess = True  # without that socket, one long-lived ping per target before ping_once
+        self._coproc = None
+        self.burst_gap_ms = 200
+        # batch_ms <= 0 reports through on_result per probe instead of on_batch
+        self.batch_ms = int(batch_ms)
+        self._batch_lock = threading.Lock()
+        self._batch: List[ProbeResult] = []
+        self._flush_at: float | None = None
+        self._external_down: set = set()
+
+    def set_jobs(self, jobs: List[DeviceJob]):
+        with self._lock:
+            self._jobs = {j.device_id: j for j in jobs}
+            self._apply_targets(self._targets.set_jobs(jobs))
+        self._notify()
+
+    # Incremental edits keep each job's phase, RTT history and backoff
+    def add_job(self, job: DeviceJob):
+        self.update_job(job)
+
+    def update_job(self, job: DeviceJob):
+        with self._lock:
+            self._jobs[job.device_id] = job
+            self._apply_targets(self._targets.upsert(job))
+        self._notify()
+
+    def remove_job(self, device_id: str):
+        with self._lock:
+            self._jobs.pop(device_id, None)
+            self._apply_targets(self._targets.remove(device_id))
+        self._notify()
+
+    def set_parent_state(self, parent_id: str, down: bool):
+        """State of a parent probed elsewhere (another shard); see ``ProbeScheduler.set_parent_state``."""
+        with self._lock:
+            (self._external_down.add if down else self._external_down.discard)(parent_id)
+            if self._sched is not None:
+                self._sched.set_parent_state(parent_id, down)
+        self._notify()
+
+    @property
+    def jobs(self) -> List[DeviceJob]:
+        return list(self._jobs.values())
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+
+    def run(self):
+        self._running = True
+        with self._lock:
+            self._sched = self._new_scheduler()
+        pool = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="ping")
+        self._coproc = self._new_coprocesses()
+        try:
+            while self._running:
+                self._wake.clear()
+                with self._lock:
+                    free = self.max_in_flight - self._sched.in_flight
+                    due = [(j, self._sched.timeout_ms(j)) for j in self._sched.pop_due(limit=free)] if free > 0 else []
+                    nxt = self._sched.next_due() if self._sched.in_flight < self.max_in_flight else None
+                    unreachable = [m for key in self._sched.take_unreachable() for m in self._targets.members(key)]
+                for device_id in unreachable:
+                    self._publish(ProbeResult.unreachable(device_id))
+                for j, timeout_ms in due:
+                    fut = self._submit_probe(pool, j, timeout_ms)
+                    fut.add_done_callback(partial(self._on_probe_done, j))
+                flush_at = self._flush_batch()
+                # Sleep until the earliest deadline; set_jobs/stop/completions wake us early
+                wake_at = min((d for d in (nxt, flush_at) if d is not None), default=None)
+                self._wake.wait(None if wake_at is None else max(0.0, wake_at - time.monotonic()))
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+            if self._coproc is not None:
+                self._coproc.close(); self._coproc = None
+            with self._lock:
+                self._sched = None
+            self._flush_batch(force=True)  # deliver what was probed before the stop
+
+    def _new_coprocesses(self):
+        if not self.ping_coprocess:
+            return None
+        import ping_coproc  # imports this module
+        return ping_coproc.PingCoprocesses() if ping_coproc.SUPPORTED else None
+
+    def _new_scheduler(self) -> ProbeScheduler:
+        self.damper = FlapDamper(**self.damping_options)
+        sched = ProbeScheduler(self._targets.target_jobs(), **self.sched_options)
+        for parent_id in self._external_down:
+            sched.set_parent_state(parent_id, True)
+        return sched
+
+    def _apply_targets(self, keys):
+        """Push the rebuilt target jobs for ``keys`` into the scheduler (lock held)."""
+        if self._sched is None:
+            return
+        for key in keys:
+            tj = self._targets.target_job(key)
+            if tj is None:
+                self._sched.remove(key); self.anomaly.forget(key); self.damper.forget(key)
+            else:
+                self._sched.upsert(tj)
+
+    def _submit_probe(self, pool: ThreadPoolExecutor, job: DeviceJob, timeout_ms: int = 1000) -> Future:
+        if not is_address(job.ip):
+            return self._submit_named(pool, job, timeout_ms)
+        if job.packets > 1:
+            return pool.submit(self._run_burst, job, timeout_ms)
+        kind, port = parse_probe(job.probe)
+        if kind != "icmp":
+            return get_port_prober().submit(job.ip, kind, port, timeout_ms)
+        icmp = get_icmp_socket() if self.native_icmp else None
+        if icmp is not None and icmp.supports(job.ip):
+            return icmp.submit(job.ip, timeout_ms)
+        fut = self._coproc.submit(job.ip, job.interval, timeout_ms) if self._coproc is not None else None
+        return fut if fut is not None else pool.submit(ping_once, job.ip, timeout_ms)
+
+    def _submit_named(self, pool: ThreadPoolExecutor, job: DeviceJob, timeout_ms: int) -> Future:
+        """Probe a hostname through the shared resolver cache; unresolvable names are offline."""
+        resolved = get_resolver().resolve(job.ip)
+        out: Future = Future()
+
+        def probe(f: Future):
+            addr = f.result()
+            if addr is None:
+                out.set_result((False, 0)); return
+            try:
+                inner = self._submit_probe(pool, replace(job, ip=addr), timeout_ms)
+            except RuntimeError:  # pool already shut down
+                out.set_result((False, 0)); return
+            inner.add_done_callback(relay)
+
+        def relay(g: Future):
+            if g.cancelled():
+                out.cancel()
+            elif g.exception() is not None:
+                out.set_exception(g.exception())
+            else:
+                out.set_result(g.result())
+        resolved.add_done_callback(probe)
+        return out
+
+    def _run_burst(self, job: DeviceJob, timeout_ms: int) -> BurstStats:
+        kind, port = parse_probe(job.probe)
+        icmp = get_icmp_socket() if self.native_icmp and kind == "icmp" else None
+        if kind == "icmp" and (icmp is None or not icmp.supports(job.ip)):
+            return ping_burst(job.ip, job.packets, timeout_ms, self.burst_gap_ms)
+        stats = BurstStats()
+        for i in range(job.packets):
+            if i:
+                time.sleep(self.burst_gap_ms/1000.0)
+            fut = icmp.submit(job.ip, timeout_ms) if icmp is not None else get_port_prober().submit(job.ip, kind, port, timeout_ms)
+            stats.add(*fut.result())
+        return stats
+
+    def _on_probe_done(self, job: DeviceJob, fut: Future):
+        if fut.cancelled():
+            res = None
+        else:
+            try:
+                res = as_result(job.device_id, fut.result())
+            except Exception:
+                res = ProbeResult.single(job.device_id, False, 0)
+        raw = res
+        if res is not None:
+            res = self.damper.update(job.device_id, self.anomaly.update(job.device_id, res))
+        with self._lock:
+            report = self._sched is not None and self._sched.complete(
+                job, None if raw is None else raw.online, 0 if raw is None else raw.ms, up=None if res is None else res.online)
+            members = self._targets.members(job.device_id)
+        self._wake.set()
+        if res is None or not report or not self._running:
+            return
+        for device_id in members:
+            self._publish(res._replace(device_id=device_id))
+
+    def _notify(self):
+        self._wake.set()
+
+    def _publish(self, result: ProbeResult):
+        if self.batch_ms <= 0:
+            if self.on_result is not None: self.on_result(result)
+            return
+        with self._batch_lock:
+            self._batch.append(result)
+            first = self._flush_at is None
+            if first:
+                self._flush_at = time.monotonic() + self.batch_ms/1000.0
+        if first:
+            self._notify()
+
+    def _flush_batch(self, force: bool = False) -> float | None:
+        """Emit the pending batch once its window has elapsed; returns the next flush deadline."""
+        with self._batch_lock:
+            if self._flush_at is None:
+                return None
+            if not force and time.monotonic() < self._flush_at:
+                return self._flush_at
+            batch, self._batch, self._flush_at = self._batch, [], None
+        if batch and self.on_batch is not None:
+            self.on_batch(batch)
+        return None
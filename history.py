@@ -1,13 +1,45 @@
 from __future__ import annotations
 import os, csv, time
 
+HEADER = ["ts","group","division","name","ip","online","ms","loss","jitter","rtt_min","rtt_avg","rtt_max"]
+_checked: set = set()
+
 def ensure_log(path: str):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
     if not os.path.exists(path):
         with open(path, 'w', newline='', encoding='utf-8') as f:
-            w = csv.writer(f); w.writerow(["ts","group","division","name","ip","online","ms"])
+            w = csv.writer(f); w.writerow(HEADER)
+    elif path not in _checked:
+        _upgrade_header(path)
+    _checked.add(path)
+
+def _upgrade_header(path: str):
+    """Logs written before burst probes have 7 columns; widen the header once, old rows stay short."""
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    if not rows or rows[0] != HEADER[:7]:
+        return
+    rows[0] = HEADER
+    tmp = path + ".tmp"
+    with open(tmp, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows(rows)
+    os.replace(tmp, path)
 
-def log_status_change(path: str, group: str, division: str, name: str, ip: str, online: bool, ms: int):
+def log_status_change(path: str, group: str, division: str, name: str, ip: str, online: bool, ms: int,
+                      loss: float = 0.0, jitter: float = 0.0, rtt_min: float = 0.0, rtt_avg: float = 0.0, rtt_max: float = 0.0):
     ensure_log(path)
     with open(path, 'a', newline='', encoding='utf-8') as f:
-        w = csv.writer(f); w.writerow([int(time.time()), group, division, name, ip, int(online), ms])
+        w = csv.writer(f); w.writerow([int(time.time()), group, division, name, ip, int(online), ms, loss, jitter, rtt_min, rtt_avg, rtt_max])
+
+INCIDENT_HEADER = ["ts","incident","key","event","members","names"]
+
+def log_incident(path: str, incident: int, key: str, event: str, names: list):
+    """One row per incident open/close instead of one per member device."""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    new = not os.path.exists(path)
+    with open(path, 'a', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        if new: w.writerow(INCIDENT_HEADER)
+        w.writerow([int(time.time()), incident, key, event, len(names), "; ".join(names)])
@@ -0,0 +1,196 @@
+from __future__ import annotations
+import heapq, ipaddress, itertools, os, select, socket, struct, sys, threading, time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+# Linux: SO_TIMESTAMPNS (== SCM_TIMESTAMPNS) gives the kernel receive time as a timespec
+_SO_TIMESTAMPNS = getattr(socket, "SO_TIMESTAMPNS", 35)
+_TIMESPEC = struct.Struct("@ll")
+_ICMP_HDR = struct.Struct("!BBHHH")
+_ECHO_REQUEST, _ECHO_REPLY = 8, 0
+_PAYLOAD = b"IPMON" + bytes(51)  # 56 bytes like the system ping
+_HAS_RECVMSG = hasattr(socket.socket, "recvmsg")  # not on Windows
+
+def _checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\0"
+    s = sum(struct.unpack(f"!{len(data)//2}H", data))
+    s = (s >> 16) + (s & 0xFFFF)
+    s += s >> 16
+    return ~s & 0xFFFF
+
+class _Pending:
+    __slots__ = ("ip", "sent_ns", "sent_mono", "deadline", "future")
+
+    def __init__(self, ip: str, deadline: float):
+        self.ip = ip; self.deadline = deadline; self.future: Future = Future()
+        self.sent_ns = time.time_ns(); self.sent_mono = time.monotonic()
+
+class IcmpEchoSocket:
+    """Sends ICMP echo requests itself and multiplexes all replies over one socket.
+
+    Uses an unprivileged ``SOCK_DGRAM``/``IPPROTO_ICMP`` socket (Linux ``ping_group_range``,
+    macOS); a raw socket is tried only when that is refused and we are privileged.
+    Replies are matched by identifier and sequence number on a single receiver thread.
+    If that thread dies, every pending probe fails and ``get_icmp_socket`` stops
+    handing the socket out, so callers fall back to the system ping.
+    """
+
+    def __init__(self):
+        self.raw = False; self.failed = False
+        try:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+        except OSError:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+            self.raw = True
+        self.sock.setblocking(False)
+        if self.raw:
+            self.ident = os.getpid() & 0xFFFF
+        else:
+            self.sock.bind(("", 0))
+            self.ident = self.sock.getsockname()[1] & 0xFFFF  # Linux rewrites the id to the socket "port"
+        # Only Linux demultiplexes datagram ICMP sockets by id; elsewhere replies to other pings arrive too
+        self.check_ident = self.raw or not sys.platform.startswith("linux")
+        self.kernel_ts = False
+        if sys.platform.startswith("linux"):
+            try:
+                self.sock.setsockopt(socket.SOL_SOCKET, _SO_TIMESTAMPNS, 1); self.kernel_ts = True
+            except OSError:
+                pass
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+        self._pending: Dict[int, _Pending] = {}
+        self._expiry: List[Tuple[float, int]] = []
+        self._closed = False
+        self._rx = threading.Thread(target=self._rx_loop, name="icmp-rx", daemon=True)
+        self._rx.start()
+
+    @staticmethod
+    def supports(ip: str) -> bool:
+        try:
+            return ipaddress.ip_address(ip).version == 4
+        except ValueError:
+            return False
+
+    def submit(self, ip: str, timeout_ms: int = 1000) -> Future:
+        """Send one echo request; the future resolves to ``(online, ms)`` like ``ping_once``."""
+        p = _Pending(ip, time.monotonic() + timeout_ms/1000.0)
+        if self._closed or self.failed:
+            p.future.set_result((False, 0)); return p.future
+        with self._lock:
+            seq = next(self._seq) & 0xFFFF
+            old = self._pending.pop(seq, None)  # 65k outstanding requests: drop the oldest owner
+            if old is not None and not old.future.done():
+                old.future.set_result((False, 0))
+            self._pending[seq] = p
+            heapq.heappush(self._expiry, (p.deadline, seq))
+        hdr = _ICMP_HDR.pack(_ECHO_REQUEST, 0, 0, self.ident, seq)
+        pkt = _ICMP_HDR.pack(_ECHO_REQUEST, 0, _checksum(hdr + _PAYLOAD), self.ident, seq) + _PAYLOAD
+        try:
+            p.sent_ns = time.time_ns(); p.sent_mono = time.monotonic()
+            self.sock.sendto(pkt, (ip, 0))
+        except OSError:
+            self._finish(seq, p, False, 0)
+        return p.future
+
+    def ping(self, ip: str, timeout_ms: int = 1000) -> Tuple[bool, int]:
+        return self.submit(ip, timeout_ms).result()
+
+    def close(self):
+        self._closed = True
+        self._rx.join(1.0)
+        try: self.sock.close()
+        except OSError: pass
+        self._fail_pending()
+
+    def _fail_pending(self):
+        with self._lock:
+            pending = list(self._pending.values()); self._pending.clear(); self._expiry.clear()
+        for p in pending:
+            if not p.future.done(): p.future.set_result((False, 0))
+
+    def _finish(self, seq: int, p: _Pending, ok: bool, ms: int):
+        with self._lock:
+            if self._pending.get(seq) is p:
+                del self._pending[seq]
+        if not p.future.done():
+            p.future.set_result((ok, ms))
+
+    def _rx_loop(self):
+        try:
+            while not self._closed:
+                with self._lock:
+                    wait = (self._expiry[0][0] - time.monotonic()) if self._expiry else 0.5
+                try:
+                    r, _, _ = select.select([self.sock], [], [], min(0.5, max(0.0, wait)))
+                except (OSError, ValueError):
+                    break
+                if r:
+                    self._drain()
+                self._expire(time.monotonic())
+        except Exception:
+            self.failed = True  # nobody would ever resolve the pending futures
+        finally:
+            if self.failed or not self._closed:
+                self.failed = True; self._fail_pending()
+
+    def _drain(self):
+        while True:
+            try:
+                if _HAS_RECVMSG:
+                    data, anc, _flags, addr = self.sock.recvmsg(2048, socket.CMSG_SPACE(_TIMESPEC.size))
+                else:
+                    (data, addr), anc = self.sock.recvfrom(2048), ()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            now_mono = time.monotonic(); rx_ns = 0
+            for level, kind, cdata in anc:
+                if level == socket.SOL_SOCKET and kind == _SO_TIMESTAMPNS and len(cdata) >= _TIMESPEC.size:
+                    sec, nsec = _TIMESPEC.unpack_from(cdata); rx_ns = sec * 1_000_000_000 + nsec
+            if data and data[0] >> 4 == 4:
+                data = data[(data[0] & 0x0F) * 4:]  # IPv4 header: raw sockets, and datagram ones on macOS
+            if len(data) < _ICMP_HDR.size:
+                continue
+            icmp_type, _code, _csum, ident, seq = _ICMP_HDR.unpack_from(data)
+            if icmp_type != _ECHO_REPLY or (self.check_ident and ident != self.ident):
+                continue
+            with self._lock:
+                p = self._pending.get(seq)
+            if p is None or p.ip != addr[0]:
+                continue
+            rtt_ms = (rx_ns - p.sent_ns) / 1e6 if rx_ns else -1.0
+            if not (0.0 <= rtt_ms < 60_000):
+                rtt_ms = (now_mono - p.sent_mono) * 1000.0
+            self._finish(seq, p, True, max(1, int(rtt_ms)))
+
+    def _expire(self, now: float):
+        expired: List[Tuple[int, _Pending]] = []
+        with self._lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                _, seq = heapq.heappop(self._expiry)
+                p = self._pending.get(seq)
+                if p is not None and p.deadline <= now:
+                    expired.append((seq, p))
+        for seq, p in expired:
+            self._finish(seq, p, False, 0)
+
+_shared: Optional[IcmpEchoSocket] = None
+_shared_failed = False
+_shared_lock = threading.Lock()
+
+def get_icmp_socket() -> Optional[IcmpEchoSocket]:
+    """Process-wide echo socket, or None when ICMP sockets are not permitted here."""
+    global _shared, _shared_failed
+    if _shared is not None and _shared.failed:
+        _shared, _shared_failed = None, True  # receiver died: use the system ping from now on
+    if _shared is not None or _shared_failed:
+        return _shared
+    with _shared_lock:
+        if _shared is None and not _shared_failed:
+            try:
+                _shared = IcmpEchoSocket()
+            except OSError:
+                _shared_failed = True
+    return _shared
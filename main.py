@@ -3,7 +3,7 @@ from __future__ import annotations
 from addons.services.theme import apply_theme
 from addons.ui.splash import show_splash
 from PyQt6.QtCore import QTimer
-import sys
+import sys, multiprocessing
 from PyQt6.QtWidgets import QApplication
 from main_window import MainWindow
 
@@ -13,6 +13,7 @@ def main():
     sys.exit(app.exec())
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # sharded engine spawns worker processes in the frozen exe
     main()
 
 
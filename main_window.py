@@ -1,28 +1,29 @@
 from __future__ import annotations
 import os, csv, json
 from pathlib import Path
-from typing import List
+from typing import Iterable, List
 from PyQt6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QMenuBar, QMenu, QStatusBar,
     QTableWidget, QTableWidgetItem, QPushButton, QLabel,
     QMessageBox, QFileDialog, QSystemTrayIcon, QStyle, QLineEdit, QComboBox,
-    QTableView, QSizePolicy, QHeaderView
+    QTableView, QSizePolicy, QHeaderView, QInputDialog
 )
-from PyQt6.QtGui import QAction, QIcon, QDesktopServices
-from PyQt6.QtCore import Qt, QUrl
+from PyQt6.QtGui import QAction, QActionGroup, QIcon, QDesktopServices
+from PyQt6.QtCore import Qt, QUrl, QTimer
 
 from license_manager import mode_label, device_limit
 from device_dialog import DeviceDialog
 from group_dialog import GroupDialog
 from report_dialog import ReportDialog
-from ping_worker import PingWorker, DeviceJob
-from data_model import Device
+from ping_worker import PingWorker, AsyncPingWorker, ShardedPingWorker, DeviceJob
+from data_model import Device, ProbeResult, STATE_UNREACHABLE, apply_result, job_for, jobs_for, resolve_parents
 from storage import save_project_json, load_project_json
 from translations import tr, set_language
 from themes import apply_theme
 from activate_dialog import ActivateDialog
 from audio import AudioAlert
-from history import ensure_log, log_status_change
+from history import ensure_log, log_incident, log_status_change
+from correlation import IncidentCorrelator, incident_keys
 from history_chart import HistoryChart
 from tables import DeviceTableModel, DeviceFilterProxy, ProgressDelegate
 from scan_dialog import ScanDialog, ScanItem
@@ -50,10 +51,18 @@ class MainWindow(QMainWindow):
         self.groups: List[str] = []
         self._load_groups()
         self.worker: PingWorker | None = None
+        self.engine_backend = "thread"
+        self.sched_options: dict = {}  # rate_limit / subnet_cap / prioritize_alerts / confirm_interval_s for ProbeScheduler
+        self.damping_options: dict = {}  # fail_threshold / ok_threshold for FlapDamper
         self._offline_alerted: set[int] = set()
 
         # Logs
         self.logs_dir = Path("logs"); self.log_path = str(self.logs_dir / "events.csv"); ensure_log(self.log_path)
+        self.incident_path = str(self.logs_dir / "incidents.csv")
+
+        # Outage correlation: one notification per subnet/group incident instead of one per device
+        self.correlator = IncidentCorrelator()
+        self._incident_timer = QTimer(self); self._incident_timer.timeout.connect(self._drain_incidents); self._incident_timer.start(1000)
 
         # Audio
         self.alert = AudioAlert(resource_path("resources", "alert.wav"))
@@ -121,6 +130,17 @@ class MainWindow(QMainWindow):
         self.menu_theme.addAction(self.act_theme_win); self.menu_theme.addAction(self.act_theme_dark); self.menu_theme.addAction(self.act_theme_light)
         self.menu_lang = self.menu_menu.addMenu(""); self.act_lang_uz = QAction(self); self.act_lang_ru = QAction(self); self.act_lang_en = QAction(self)
         self.menu_lang.addAction(self.act_lang_uz); self.menu_lang.addAction(self.act_lang_ru); self.menu_lang.addAction(self.act_lang_en)
+        self.menu_engine = self.menu_menu.addMenu("Monitoring dvigateli"); self.engine_group = QActionGroup(self)
+        self.act_engine_thread = QAction("Oqimlar (thread pool)", self); self.act_engine_async = QAction("asyncio (bitta event loop)", self)
+        self.act_engine_sharded = QAction("Ko‘p jarayonli (har yadroga bitta)", self)
+        for a in (self.act_engine_thread, self.act_engine_async, self.act_engine_sharded): a.setCheckable(True); self.engine_group.addAction(a); self.menu_engine.addAction(a)
+        self.act_engine_thread.setChecked(True)
+        self.menu_engine.addSeparator()
+        self.act_rate_limit = QAction("Tezlik cheklovi (so‘rov/s)…", self); self.act_subnet_cap = QAction("Bitta /24 tarmoqqa parallel so‘rovlar…", self)
+        self.act_prioritize_alerts = QAction("Ogohlantirishli qurilmalarga ustunlik", self); self.act_prioritize_alerts.setCheckable(True)
+        self.act_fail_threshold = QAction("Offline deb hisoblash uchun ketma-ket xatolar…", self)
+        self.act_confirm_interval = QAction("Xatodan keyin tezkor qayta tekshirish (s)…", self)
+        for a in (self.act_rate_limit, self.act_subnet_cap, self.act_prioritize_alerts, self.act_fail_threshold, self.act_confirm_interval): self.menu_engine.addAction(a)
 
         self.act_activate = QAction(self); self.act_update = QAction(self); self.act_about = QAction(self); self.act_support = QAction(self)
         self.menu_help.addAction(self.act_activate); self.menu_help.addAction(self.act_update); self.menu_help.addAction(self.act_about); self.menu_help.addAction(self.act_support)
@@ -132,7 +152,7 @@ class MainWindow(QMainWindow):
         # Top filter
         filt = QHBoxLayout()
         self.ed_search = QLineEdit(); self.ed_search.setPlaceholderText("Qidirish (nom yoki IP)…")
-        self.cb_group = QComboBox(); self.cb_status = QComboBox(); self.cb_status.addItems(["Barchasi","Online","Offline"])
+        self.cb_group = QComboBox(); self.cb_status = QComboBox(); self.cb_status.addItems(["Barchasi","Online","Degraded","Flapping","Offline","Unreachable"])
         self.btn_clear_filter = QPushButton("Filtrni tozalash")
         filt.addWidget(QLabel("Qidiruv:")); filt.addWidget(self.ed_search,2)
         filt.addWidget(QLabel("Guruh:")); filt.addWidget(self.cb_group,1)
@@ -168,6 +188,12 @@ class MainWindow(QMainWindow):
         self.act_lang_uz.triggered.connect(lambda: self.change_lang("uz"))
         self.act_lang_ru.triggered.connect(lambda: self.change_lang("ru"))
         self.act_lang_en.triggered.connect(lambda: self.change_lang("en"))
+        self.act_engine_thread.triggered.connect(lambda: self.set_engine_backend("thread"))
+        self.act_engine_async.triggered.connect(lambda: self.set_engine_backend("asyncio"))
+        self.act_engine_sharded.triggered.connect(lambda: self.set_engine_backend("sharded"))
+        self.act_rate_limit.triggered.connect(self.set_rate_limit); self.act_subnet_cap.triggered.connect(self.set_subnet_cap)
+        self.act_fail_threshold.triggered.connect(self.set_fail_threshold); self.act_confirm_interval.triggered.connect(self.set_confirm_interval)
+        self.act_prioritize_alerts.toggled.connect(lambda on: self._set_sched_option("prioritize_alerts", on))
         self.act_activate.triggered.connect(self.reactivate); self.act_update.triggered.connect(self.fake_update)
         self.act_about.triggered.connect(self.show_about); self.act_support.triggered.connect(self.show_support)
 
@@ -209,6 +235,26 @@ class MainWindow(QMainWindow):
     # help/menu callbacks
     def change_lang(self, lang: str):
         set_language(lang); self._retranslate_ui(); QMessageBox.information(self, "Info", f"Til o‘zgartirildi: {lang}")
+    def set_engine_backend(self, backend: str):
+        self.engine_backend = backend
+        if self.worker and self.worker.isRunning(): self.sb.showMessage("Dvigatel monitoring qayta ishga tushirilganda almashadi.")
+    def set_rate_limit(self):
+        val, ok = QInputDialog.getDouble(self, "Tezlik cheklovi", "Soniyasiga so‘rovlar (0 = cheklovsiz):", float(self.sched_options.get("rate_limit", 0.0)), 0.0, 100000.0, 1)
+        if ok: self._set_sched_option("rate_limit", val)
+    def set_subnet_cap(self):
+        val, ok = QInputDialog.getInt(self, "Tarmoq cheklovi", "Bitta /24 tarmoqqa parallel so‘rovlar (0 = cheklovsiz):", int(self.sched_options.get("subnet_cap", 0)), 0, 10000)
+        if ok: self._set_sched_option("subnet_cap", val)
+    def set_fail_threshold(self):
+        val, ok = QInputDialog.getInt(self, "Gisterezis", "Offline holati nechta ketma-ket xatodan keyin qayd etilsin:", int(self.damping_options.get("fail_threshold", 2)), 1, 20)
+        if ok:
+            self.damping_options["fail_threshold"] = val
+            if self.worker and self.worker.isRunning(): self.sb.showMessage("Sozlama monitoring qayta ishga tushirilganda qo‘llanadi.")
+    def set_confirm_interval(self):
+        val, ok = QInputDialog.getDouble(self, "Tezkor tasdiqlash", "Online qurilma javob bermasa, necha soniyadan keyin qayta tekshirilsin (0 = darhol):", float(self.sched_options.get("confirm_interval_s", 2.0)), 0.0, 60.0, 1)
+        if ok: self._set_sched_option("confirm_interval_s", val)
+    def _set_sched_option(self, key: str, value):
+        self.sched_options[key] = value
+        if self.worker and self.worker.isRunning(): self.sb.showMessage("Sozlama monitoring qayta ishga tushirilganda qo‘llanadi.")
     def reactivate(self): ActivateDialog(self).exec(); self._update_status()
     def fake_update(self): QMessageBox.information(self, tr("update"), "Yangilash xizmati keyingi relizda qo‘shiladi.")
     def show_about(self): QMessageBox.information(self, tr("about"), "IP Monitoring 2025\n" + f"Holat: {mode_label()}")
@@ -223,12 +269,33 @@ class MainWindow(QMainWindow):
     def _refresh_row_from_device(self, row: int): self.model.update_row(row)
 
     def get_all_jobs(self) -> List[DeviceJob]:
-        return [DeviceJob(row=i, ip=d.ip, interval=max(1, d.interval)) for i,d in enumerate(self.devices)]
+        return jobs_for(self.devices)
+
+    def _sync_jobs(self, devices: Iterable[Device], groups: Iterable[str] = ()):
+        # Parents follow the group/division hierarchy: when a gateway or parent changes,
+        # every device of those groups may be re-parented, so they are re-sent as well.
+        if not (self.worker and self.worker.isRunning()): return
+        ids = {d.id for d in devices}; groups = set(groups)
+        for job in self._jobs_for_subset([d for d in self.devices if d.id in ids or d.group in groups]):
+            self.worker.update_job(job)
+
+    def _jobs_for_subset(self, subset: List[Device]) -> List[DeviceJob]:
+        """Jobs of ``subset``, parents resolved over its groups and the groups its explicit parents live in."""
+        by_id = {d.id: d for d in self.devices}
+        groups = {d.group for d in subset}; pending = set(groups)
+        while pending:
+            pending = {by_id[d.parent].group for d in self.devices if d.group in pending and d.parent in by_id} - groups
+            groups |= pending
+        parents = resolve_parents([d for d in self.devices if d.group in groups])
+        return [job_for(d, parents[d.id]) for d in subset]
+
+    def _parent_choices(self, exclude: str = "") -> list:
+        return [(d.id, f"{d.name} [{d.ip}]") for d in self.devices if d.id != exclude]
 
     def recompute_stats(self):
         stats = {}
         for d in self.devices:
-            g=d.group; stats.setdefault(g,[0,0,0]); stats[g][0]+=1; stats[g][1]+=1 if d.online else 0; stats[g][2]+=0 if d.online else 1
+            g=d.group; stats.setdefault(g,[0,0,0]); stats[g][0]+=1; up = d.online and d.state != STATE_UNREACHABLE; stats[g][1]+=1 if up else 0; stats[g][2]+=0 if up else 1
         self.stat.setRowCount(0)
         for g,(jami,onl,off) in sorted(stats.items()):
             rr=self.stat.rowCount(); self.stat.insertRow(rr)
@@ -256,12 +323,13 @@ class MainWindow(QMainWindow):
         lim = device_limit()
         if lim is not None and len(self.devices) >= lim:
             QMessageBox.information(self, "Cheklov", f"DEMO rejimida maksimal {lim} ta qurilma qo‘shishingiz mumkin."); return
-        dlg = DeviceDialog(self.groups, self)
+        dlg = DeviceDialog(self.groups, self, parents=self._parent_choices())
         if dlg.exec() == dlg.DialogCode.Accepted:
             d = dlg.get_data()
-            dev = Device(d["group"], d["division"], d["name"], d["ip"], int(d["interval"]), bool(d["alert"]), False, 0)
+            dev = Device(d["group"], d["division"], d["name"], d["ip"], int(d["interval"]), bool(d["alert"]), False, 0, d["probe"], packets=int(d["packets"]),
+                         gateway=d["gateway"], parent=d["parent"])
             self._append_device(dev); self.populate_group_filter(); self.recompute_stats(); self.apply_filter()
-            if self.worker and self.worker.isRunning(): self.worker.set_jobs(self.get_all_jobs())
+            self._sync_jobs([dev], [dev.group] if dev.gateway else ())
 
     def edit_device(self):
         idx = self.view.currentIndex()
@@ -270,12 +338,13 @@ class MainWindow(QMainWindow):
         source_row = self.proxy.mapToSource(idx).row()
         if not (0 <= source_row < len(self.devices)): return
         dev = self.devices[source_row]
-        dlg = DeviceDialog(self.groups, self, device_data=dev.__dict__)
+        dlg = DeviceDialog(self.groups, self, device_data=dev.__dict__, parents=self._parent_choices(dev.id))
         if dlg.exec() == dlg.DialogCode.Accepted:
-            d = dlg.get_data()
-            dev.group=d["group"]; dev.division=d["division"]; dev.name=d["name"]; dev.ip=d["ip"]; dev.interval=int(d["interval"]); dev.alert=bool(d["alert"])
+            d = dlg.get_data(); before = (dev.group, dev.division, dev.gateway, dev.parent)
+            dev.group=d["group"]; dev.division=d["division"]; dev.name=d["name"]; dev.ip=d["ip"]; dev.interval=int(d["interval"]); dev.alert=bool(d["alert"]); dev.probe=d["probe"]; dev.packets=int(d["packets"])
+            dev.gateway=d["gateway"]; dev.parent=d["parent"]
             self.model.update_row(source_row); self.populate_group_filter(); self.recompute_stats()
-            if self.worker and self.worker.isRunning(): self.worker.set_jobs(self.get_all_jobs())
+            self._sync_jobs([dev], {before[0], dev.group} if before != (dev.group, dev.division, dev.gateway, dev.parent) else ())
 
     def delete_selected(self):
         idx = self.view.currentIndex()
@@ -283,8 +352,13 @@ class MainWindow(QMainWindow):
             QMessageBox.information(self, "Tanlov", "O‘chirish uchun bir qatorni tanlang."); return
         source_row = self.proxy.mapToSource(idx).row()
         if not (0 <= source_row < len(self.devices)): return
-        self.model.remove_row(source_row); self.populate_group_filter(); self.recompute_stats()
-        if self.worker and self.worker.isRunning(): self.worker.set_jobs(self.get_all_jobs())
+        dev = self.devices[source_row]; dev_id = dev.id
+        self.model.remove_row(source_row); self.correlator.forget(dev_id)
+        orphans = [d for d in self.devices if d.parent == dev_id]
+        for d in orphans: d.parent = ""
+        self.populate_group_filter(); self.recompute_stats()
+        if self.worker and self.worker.isRunning(): self.worker.remove_job(dev_id)
+        self._sync_jobs(orphans, [dev.group] if dev.gateway else ())
 
     # file menu
     def action_save(self):
@@ -298,7 +372,7 @@ class MainWindow(QMainWindow):
         if path:
             try:
                 if self.worker and self.worker.isRunning(): self.worker.stop(); self.worker.wait(2000); self.btn_start_stop.setText(tr("start_monitor"))
-                devs = load_project_json(path); self.devices.clear(); self.model.beginResetModel(); self.devices.extend(devs); self.model.endResetModel()
+                devs = load_project_json(path); self.model.set_devices(devs)
                 self.populate_group_filter(); self.recompute_stats(); self.apply_filter()
             except Exception as e:
                 QMessageBox.critical(self, "Xatolik", f"Yuklashda xatolik: {e}")
@@ -333,26 +407,66 @@ class MainWindow(QMainWindow):
             self.worker.stop(); self.worker.wait(2000); self.btn_start_stop.setText(tr("start_monitor")); self._update_status(); return
         if not self.devices:
             QMessageBox.information(self, "Ma’lumot yo‘q", "Monitoring uchun kamida bitta qurilma qo‘shing."); return
-        self.worker = PingWorker(parent=self); self.worker.ping_result.connect(self.on_ping_result)
+        worker_cls = {"asyncio": AsyncPingWorker, "sharded": ShardedPingWorker}.get(self.engine_backend, PingWorker)
+        self.worker = worker_cls(parent=self); self.worker.engine.sched_options = dict(self.sched_options); self.worker.engine.damping_options = dict(self.damping_options); self.worker.ping_result.connect(self.on_ping_result); self.worker.ping_batch.connect(self.on_ping_batch)
         if hasattr(self.worker, "started_monitoring"): self.worker.started_monitoring.connect(lambda: self.sb.showMessage("Monitoring boshlandi…"))
         if hasattr(self.worker, "stopped_monitoring"): self.worker.stopped_monitoring.connect(lambda: self.sb.showMessage(f"Monitoring to‘xtadi – {mode_label()}"))
         self.worker.set_jobs(self.get_all_jobs()); self.worker.start(); self.btn_start_stop.setText(tr("stop_monitor"))
 
-    def on_ping_result(self, row: int, online: bool, ms: int):
-        if not (0 <= row < len(self.devices)): return
-        d = self.devices[row]; was_online = d.online; d.online = online; d.last_ms = ms if online else d.last_ms
-        self._refresh_row_from_device(row); self.recompute_stats()
-        if was_online != online:
-            log_status_change(self.log_path, d.group, d.division, d.name, d.ip, online, ms)
-            title = f"{d.name} [{d.ip}]"
-            if self.tray.isVisible():
-                try:
-                    if online: self.tray.showMessage(title, "Online bo‘ldi", QSystemTrayIcon.MessageIcon.Information, 3500)
-                    else: self.tray.showMessage(title, "OFFLINE bo‘ldi!", QSystemTrayIcon.MessageIcon.Warning, 3500)
-                except Exception: pass
-            if was_online and (not online):
-                try: self.alert.play()
-                except Exception: pass
+    def on_ping_result(self, r: ProbeResult):
+        row = self.model.row_of(r.device_id)
+        if row is None: return
+        self._apply_ping_result(row, r); self._refresh_row_from_device(row); self.recompute_stats()
+
+    def on_ping_batch(self, batch: list):
+        rows = []
+        for r in batch:
+            row = self.model.row_of(r.device_id)
+            if row is not None: self._apply_ping_result(row, r); rows.append(row)
+        if rows: self.model.update_rows(rows); self.recompute_stats()
+
+    def _apply_ping_result(self, row: int, r: ProbeResult):
+        d = self.devices[row]
+        if apply_result(d, r):
+            self.correlator.add(d.id, r.online, incident_keys(d.ip, d.group, d.division), r)
+
+    def _drain_incidents(self):
+        for kind, ev in self.correlator.poll():
+            if kind == "device":
+                row = self.model.row_of(ev.device_id)
+                if row is not None: self._notify_change(self.devices[row], ev.data)
+            else:
+                self._notify_incident(kind, ev)
+
+    def _notify_change(self, d: Device, r: ProbeResult):
+        online = r.online
+        log_status_change(self.log_path, d.group, d.division, d.name, d.ip, online, r.ms, r.loss, r.jitter, r.rtt_min, r.rtt_avg, r.rtt_max)
+        title = f"{d.name} [{d.ip}]"
+        if self.tray.isVisible():
+            try:
+                if online: self.tray.showMessage(title, "Online bo‘ldi", QSystemTrayIcon.MessageIcon.Information, 3500)
+                else: self.tray.showMessage(title, "OFFLINE bo‘ldi!", QSystemTrayIcon.MessageIcon.Warning, 3500)
+            except Exception: pass
+        if not online:
+            try: self.alert.play()
+            except Exception: pass
+
+    def _notify_incident(self, kind: str, inc):
+        rows = [self.model.row_of(m) for m in inc.members]
+        names = [f"{self.devices[r].name} [{self.devices[r].ip}]" for r in rows if r is not None]
+        log_incident(self.incident_path, inc.id, inc.key, kind, names)
+        title = f"Hodisa #{inc.id}: {inc.key}"
+        if kind == "open":
+            self.sb.showMessage(f"{title} – {len(names)} ta qurilma OFFLINE")
+            msg, icon = f"{len(names)} ta qurilma OFFLINE:\n" + "\n".join(names[:5]) + ("\n…" if len(names) > 5 else ""), QSystemTrayIcon.MessageIcon.Warning
+        else:
+            msg, icon = f"Tiklandi ({len(names)} ta qurilma)", QSystemTrayIcon.MessageIcon.Information
+        if self.tray.isVisible():
+            try: self.tray.showMessage(title, msg, icon, 5000)
+            except Exception: pass
+        if kind == "open":
+            try: self.alert.play()
+            except Exception: pass
 
     # close behavior
     def closeEvent(self, event):
@@ -370,12 +484,12 @@ class MainWindow(QMainWindow):
         existing = {d.ip for d in self.devices}; groups = self.groups[:] if self.groups else DEFAULT_GROUPS; divisions = DEFAULT_DIVISIONS
         dlg = ScanDialog(existing_ips=existing, groups=groups, divisions=divisions, parent=self)
         def on_ready(items: list):
+            added = []
             for it in items:
                 dev = Device(group=it.group or (groups[0] if groups else "Default"), division=it.division or "", name=(it.name or f"Device {it.ip}"),
                              ip=it.ip, interval=int(it.interval), alert=False, online=bool(it.online), last_ms=int(it.ms))
-                self._append_device(dev)
-            self.populate_group_filter(); self.recompute_stats()
-            if self.worker and self.worker.isRunning(): self.worker.set_jobs(self.get_all_jobs())
+                self._append_device(dev); added.append(dev)
+            self.populate_group_filter(); self.recompute_stats(); self._sync_jobs(added)
         dlg.devices_ready.connect(on_ready); dlg.exec()
 
 
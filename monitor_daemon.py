@@ -0,0 +1,197 @@
+"""Headless IP monitoring service (no Qt).
+
+    python monitor_daemon.py project.json --status-port 8765
+
+Loads a project saved by the GUI, probes it with the same engine, appends status
+changes to the events CSV and serves the current state as JSON.
+"""
+from __future__ import annotations
+import argparse, json, logging, os, signal, sys, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+from data_model import Device, STATE_DEGRADED, STATE_FLAPPING, STATE_UNREACHABLE, apply_result, jobs_for
+from storage import load_project_json
+from history import ensure_log, log_incident, log_status_change
+from correlation import IncidentCorrelator, incident_keys
+from shards import ENGINES, ShardedEngine
+
+log = logging.getLogger("ipmonitor")
+
+class Monitor:
+    def __init__(self, devices: List[Device], log_path: str, engine: str = "thread", max_in_flight: Optional[int] = None,
+                 batch_ms: int = 500, status_file: Optional[str] = None, status_every_s: float = 5.0, shards: int = 1,
+                 sched_options: Optional[dict] = None, damping_options: Optional[dict] = None,
+                 incident_options: Optional[dict] = None):
+        self.devices = {d.id: d for d in devices}
+        self.log_path = log_path; ensure_log(log_path)
+        self.incident_path = os.path.join(os.path.dirname(log_path), "incidents.csv")
+        self.correlator = IncidentCorrelator(**(incident_options or {}))
+        self._stopping = threading.Event()
+        self.status_file = status_file
+        self.status_every_s = status_every_s
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._status_written = 0.0
+        jobs = jobs_for(devices)
+        if shards > 1:
+            self.engine = ShardedEngine(jobs, max_in_flight, batch_ms, on_batch=self.apply_batch, shards=shards, engine=engine)
+        else:
+            self.engine = ENGINES[engine](jobs, max_in_flight, batch_ms, on_batch=self.apply_batch)
+        self.engine.sched_options = dict(sched_options or {})
+        self.engine.damping_options = dict(damping_options or {})
+
+    def run(self):
+        log.info("Monitoring %d devices (%s)", len(self.devices), type(self.engine).__name__)
+        self._stopping.clear()
+        threading.Thread(target=self._incident_loop, name="incidents", daemon=True).start()
+        self.engine.run()
+        self._stopping.set()
+        self.flush_incidents()
+        self.write_status(force=True)
+        log.info("Monitoring stopped")
+
+    def stop(self):
+        self.engine.stop()
+
+    def _incident_loop(self):
+        while not self._stopping.wait(1.0):
+            self.flush_incidents()
+
+    def apply_batch(self, batch: list):
+        with self._lock:
+            for r in batch:
+                d = self.devices.get(r.device_id)
+                if d is None:
+                    continue
+                was_degraded = d.state == STATE_DEGRADED; was_flapping = d.state == STATE_FLAPPING
+                if apply_result(d, r):
+                    self.correlator.add(d.id, r.online, incident_keys(d.ip, d.group, d.division), r)
+                if was_flapping != (r.state == STATE_FLAPPING):
+                    log.warning("%s [%s] %s", d.name, d.ip, "FLAPPING" if r.state == STATE_FLAPPING else "STABLE")
+                elif r.online and was_degraded != (r.state == STATE_DEGRADED):
+                    log.warning("%s [%s] %s (%d ms, p95 %g ms)", d.name, d.ip,
+                                "DEGRADED" if r.state == STATE_DEGRADED else "RECOVERED", r.ms, r.p95)
+        self.flush_incidents()
+        self.write_status()
+
+    def flush_incidents(self):
+        """Log the changes the correlator released: single devices, or one line per incident."""
+        with self._lock:
+            for kind, ev in self.correlator.poll():
+                if kind == "device":
+                    d, r = self.devices.get(ev.device_id), ev.data
+                    if d is None:
+                        continue
+                    log_status_change(self.log_path, d.group, d.division, d.name, d.ip, r.online, r.ms,
+                                      r.loss, r.jitter, r.rtt_min, r.rtt_avg, r.rtt_max)
+                    log.warning("%s [%s] %s", d.name, d.ip, "ONLINE" if r.online else "OFFLINE")
+                    continue
+                names = [f"{d.name} [{d.ip}]" for d in (self.devices.get(m) for m in ev.members) if d is not None]
+                log_incident(self.incident_path, ev.id, ev.key, kind, names)
+                if kind == "open":
+                    log.warning("INCIDENT #%d %s: %d devices OFFLINE (%s)", ev.id, ev.key, len(names), ", ".join(names))
+                else:
+                    log.warning("INCIDENT #%d %s: resolved after %d s", ev.id, ev.key, int(ev.closed - ev.opened))
+
+    def status(self) -> dict:
+        with self._lock:
+            rows = [{"id": d.id, "group": d.group, "division": d.division, "name": d.name, "ip": d.ip,
+                     "probe": d.probe, "online": d.online and d.state != STATE_UNREACHABLE,
+                     "ms": d.last_ms if d.online else None, "state": d.state or ("online" if d.online else "offline"),
+                     **({"p50": d.p50, "p95": d.p95} if d.p50 else {}),
+                     **({"packets": d.packets, "loss": d.loss, "jitter": d.jitter,
+                         "rtt": [d.rtt_min, d.rtt_avg, d.rtt_max]} if d.packets > 1 else {})}
+                    for d in self.devices.values()]
+            incidents = [{"id": i.id, "key": i.key, "opened": int(i.opened), "members": list(i.members),
+                          "down": len(i.down)} for i in self.correlator.open_incidents]
+        online = sum(1 for r in rows if r["online"])
+        unreachable = sum(1 for r in rows if r["state"] == STATE_UNREACHABLE)
+        degraded = sum(1 for r in rows if r["state"] == STATE_DEGRADED)
+        flapping = sum(1 for r in rows if r["state"] == STATE_FLAPPING)
+        return {"started": int(self.started), "ts": int(time.time()), "total": len(rows), "online": online,
+                "offline": len(rows) - online - unreachable, "unreachable": unreachable,
+                "degraded": degraded, "flapping": flapping, "incidents": incidents, "devices": rows}
+
+    def write_status(self, force: bool = False):
+        if not self.status_file:
+            return
+        now = time.monotonic()
+        if not force and now - self._status_written < self.status_every_s:
+            return
+        self._status_written = now
+        tmp = self.status_file + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.status(), f, ensure_ascii=False)
+            os.replace(tmp, self.status_file)
+        except OSError as e:
+            log.error("Status faylini yozib bo'lmadi: %s", e)
+
+class _StatusHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/status"):
+            self.send_error(404); return
+        body = json.dumps(self.server.monitor.status(), ensure_ascii=False).encode("utf-8")  # type: ignore[attr-defined]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        log.debug("http: " + fmt, *args)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="IP Monitoring 2025 - headless monitoring service")
+    ap.add_argument("project", nargs="?", default="autosave.json", help="project JSON saved by the GUI")
+    ap.add_argument("--log", default=os.path.join("logs", "events.csv"), help="status change CSV")
+    ap.add_argument("--engine", choices=sorted(ENGINES), default="thread")
+    ap.add_argument("--max-in-flight", type=int, default=None, help="concurrent probes per process")
+    ap.add_argument("--shards", type=int, default=1, help="worker processes to spread devices over")
+    ap.add_argument("--rate-limit", type=float, default=0.0, help="global probes per second (0 = unlimited)")
+    ap.add_argument("--subnet-cap", type=int, default=0, help="concurrent probes per /24 (0 = unlimited)")
+    ap.add_argument("--prioritize-alerts", action="store_true", help="probe alert devices first under load")
+    ap.add_argument("--fail-threshold", type=int, default=2, help="failures in a row before a device is reported offline")
+    ap.add_argument("--ok-threshold", type=int, default=1, help="answers in a row before it is reported online again")
+    ap.add_argument("--confirm-interval", type=float, default=2.0, help="seconds to the re-probe after an online device fails")
+    ap.add_argument("--incident-window", type=float, default=60.0, help="seconds in which outages of one subnet/group are correlated")
+    ap.add_argument("--incident-min", type=int, default=3, help="outages in the window that open one incident (0 = off)")
+    ap.add_argument("--status-file", help="write current status JSON here every few seconds")
+    ap.add_argument("--status-host", default="127.0.0.1")
+    ap.add_argument("--status-port", type=int, default=0, help="serve GET /status on this port (0 = off)")
+    ap.add_argument("-v", "--verbose", action="store_true")
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    try:
+        devices = load_project_json(args.project)
+    except Exception as e:
+        log.error("Loyihani yuklab bo'lmadi (%s): %s", args.project, e); return 2
+    if not devices:
+        log.error("Loyihada qurilmalar yo'q: %s", args.project); return 2
+
+    sched_options = {"rate_limit": args.rate_limit, "subnet_cap": args.subnet_cap, "prioritize_alerts": args.prioritize_alerts,
+                     "confirm_interval_s": args.confirm_interval}
+    mon = Monitor(devices, args.log, args.engine, args.max_in_flight, status_file=args.status_file, shards=args.shards,
+                  sched_options=sched_options,
+                  damping_options={"fail_threshold": args.fail_threshold, "ok_threshold": args.ok_threshold},
+                  incident_options={"window_s": args.incident_window, "min_members": args.incident_min})
+    server = None
+    if args.status_port:
+        server = ThreadingHTTPServer((args.status_host, args.status_port), _StatusHandler)
+        server.daemon_threads = True
+        server.monitor = mon  # type: ignore[attr-defined]
+        threading.Thread(target=server.serve_forever, name="status-http", daemon=True).start()
+        log.info("Status: http://%s:%d/status", args.status_host, args.status_port)
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: mon.stop())
+    try:
+        mon.run()
+    finally:
+        if server is not None:
+            server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+from __future__ import annotations
+import re, subprocess, sys, threading, time
+from typing import Dict, Optional
+
+_MAC = re.compile(r"([0-9a-fA-F]{1,2}(?:[:-][0-9a-fA-F]{1,2}){5})")
+_ZERO_MAC = "00:00:00:00:00:00"
+
+def _norm_mac(mac: str) -> str:
+    return ":".join(p.zfill(2) for p in re.split(r"[:-]", mac.lower()))
+
+def _read_proc_arp() -> Optional[Dict[str, str]]:
+    """Linux kernel ARP table: ``IP HWtype Flags HWaddress Mask Device``, no subprocess."""
+    try:
+        with open("/proc/net/arp", "r", encoding="ascii", errors="ignore") as f:
+            lines = f.read().splitlines()[1:]
+    except OSError:
+        return None
+    table: Dict[str, str] = {}
+    for line in lines:
+        cols = line.split()
+        if len(cols) >= 4 and cols[2] != "0x0" and cols[3] != _ZERO_MAC:  # 0x0: incomplete entry
+            table[cols[0]] = cols[3].lower()
+    return table
+
+def _read_command(cmd, encoding: str) -> Dict[str, str]:
+    """Whole neighbor table from ``ip neigh`` / ``arp -a``: the first address and the MAC after it."""
+    try:
+        out = subprocess.run(cmd, capture_output=True, text=True, encoding=encoding, errors="ignore", timeout=3)
+    except Exception:
+        return {}
+    table: Dict[str, str] = {}
+    for line in (out.stdout or "").splitlines():
+        ip = re.search(r"(\d{1,3}(?:\.\d{1,3}){3}|[0-9a-fA-F]*:[0-9a-fA-F:]+(?=\s))", line)
+        m = _MAC.search(line, ip.end()) if ip else None  # an IPv6 address can look like a MAC
+        if m and _norm_mac(m.group(1)) != _ZERO_MAC:
+            table[ip.group(1)] = _norm_mac(m.group(1))
+    return table
+
+def read_neighbors(ipv6: bool = False) -> Dict[str, str]:
+    """IP -> MAC for every resolved neighbor of this host, in one read.
+
+    On Linux the IPv6 (NDP) table needs a subprocess, so it is only read with ``ipv6``.
+    """
+    if sys.platform.startswith("win"):
+        return _read_command(["arp", "-a"], "mbcs")
+    table = _read_proc_arp()
+    if sys.platform.startswith("linux"):
+        if table is None:
+            return _read_command(["ip", "neigh", "show"], "utf-8")
+        return {**_read_command(["ip", "-6", "neigh", "show"], "utf-8"), **table} if ipv6 else table
+    return _read_command(["arp", "-an"], "utf-8")
+
+class NeighborTable:
+    """Cached snapshot of the neighbor (ARP/NDP) table for MAC lookups in O(1).
+
+    The table is read at most once per ``ttl_s``; a miss re-reads it only when the
+    snapshot is older than ``miss_refresh_s``, because hosts that just answered a
+    sweep land in the kernel table a moment after the snapshot was taken. Callers that
+    collect the remaining misses can ``refresh`` once and look them up again.
+    IPv6 neighbors are read only once an IPv6 address is looked up.
+    """
+
+    def __init__(self, ttl_s: float = 10.0, miss_refresh_s: float = 0.5, clock=time.monotonic):
+        self.ttl_s = ttl_s
+        self.miss_refresh_s = miss_refresh_s
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._table: Dict[str, str] = {}
+        self._read_at: Optional[float] = None
+        self._ipv6 = False  # whether the snapshot includes the IPv6 table
+
+    def refresh(self, ipv6: bool = False):
+        table = read_neighbors(ipv6)
+        with self._lock:
+            self._table = table; self._read_at = self.clock(); self._ipv6 = ipv6
+
+    def lookup(self, ip: str) -> str:
+        now = self.clock(); v6 = ":" in ip
+        age = None if self._read_at is None else now - self._read_at
+        if age is None or age > self.ttl_s or (v6 and not self._ipv6):
+            self.refresh(v6); age = 0.0
+        mac = self._table.get(ip)
+        if mac is None and self.miss_refresh_s < age <= self.ttl_s:
+            self.refresh(v6); mac = self._table.get(ip)
+        return mac or ""
+
+_shared: Optional[NeighborTable] = None
+_shared_lock = threading.Lock()
+
+def get_neighbor_table() -> NeighborTable:
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = NeighborTable()
+    return _shared
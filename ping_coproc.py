@@ -0,0 +1,217 @@
+from __future__ import annotations
+import os, selectors, subprocess, sys, threading, time
+from concurrent.futures import Future, InvalidStateError
+from typing import Dict, List, Optional, Tuple
+from engine import _ANY_MS
+
+SUPPORTED = not sys.platform.startswith("win")  # Windows ping has no -i, and select() takes sockets only
+
+def _coproc_cmd(ip: str, interval_s: float, timeout_ms: int) -> List[str]:
+    # Unprivileged ping refuses intervals below 0.2 s
+    interval = f"{max(0.2, interval_s):g}"
+    if sys.platform.startswith("linux"):  # iputils: -O prints a line for every unanswered request
+        return ["ping", "-n", "-O", "-i", interval, "-W", str(max(1, int(timeout_ms/1000))), ip]
+    return ["ping", "-n", "-i", interval, ip]  # BSD/macOS print "Request timeout" on their own
+
+def _parse_line(line: str) -> Optional[Tuple[bool, int]]:
+    """One reply or one loss from a running ping, None for banners and summaries."""
+    low = line.lower()
+    if "ttl=" in low or "ttl " in low:
+        m = _ANY_MS.search(line)
+        try:
+            ms = int(float(m.group(1).replace(",", ".").lstrip("<"))) if m else 1
+        except ValueError:
+            ms = 1
+        return True, max(1, ms)
+    if "no answer" in low or "timeout" in low or "unreachable" in low:
+        return False, 0
+    return None
+
+def _resolve(fut: Future, value):
+    """Set a waiter's result unless it is already settled (the asyncio engine cancels its waits on stop)."""
+    if not fut.done():
+        try:
+            fut.set_result(value)
+        except InvalidStateError:  # cancelled between the check and here
+            pass
+
+def _done(value) -> Future:
+    fut: Future = Future()
+    fut.set_result(value)
+    return fut
+
+class _Coproc:
+    __slots__ = ("ip", "interval", "timeout_ms", "proc", "buf", "sample", "sample_at", "fresh", "waiters", "used",
+                 "restarts", "start_at")
+
+    def __init__(self, ip: str, interval: float, timeout_ms: int, now: float):
+        self.ip = ip; self.interval = interval; self.timeout_ms = timeout_ms
+        self.proc: Optional[subprocess.Popen] = None; self.buf = b""
+        self.sample: Tuple[bool, int] = (False, 0); self.sample_at = 0.0; self.fresh = False
+        self.waiters: List[Tuple[float, Future]] = []  # (deadline, future)
+        self.used = now; self.restarts = 0; self.start_at = now
+
+class PingCoprocesses:
+    """One long-lived ``ping -i <interval>`` child per target instead of a fork per probe.
+
+    A single thread reads every child's stdout as it arrives, so a child never blocks
+    on a full pipe, and keeps only the latest reply per target. ``submit`` hands that
+    reply out once if it is no older than the probe timeout, else waits for the next
+    one, so a probe never reports the previous cycle; it returns None when the caller should
+    fall back to ``ping_once``: the child is not running yet, is being restarted, the
+    last sample was a loss (a quick confirm probe must not wait a whole interval) or
+    ``max_procs`` children already run. Dead children are restarted with exponential
+    backoff, idle ones are stopped, and ``close`` kills them all.
+
+    The children keep their own cadence, so scheduler backoff and the rate budget do
+    not slow them down; ``max_procs`` bounds the load instead.
+    """
+
+    def __init__(self, max_procs: int = 256, idle_s: float = 120.0, max_restart_s: float = 60.0, clock=time.monotonic):
+        self.max_procs = max(1, int(max_procs))
+        self.idle_s = idle_s
+        self.max_restart_s = max_restart_s
+        self.clock = clock
+        self.available = SUPPORTED
+        self._lock = threading.Lock()
+        self._procs: Dict[str, _Coproc] = {}
+        self._sel = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = os.pipe()
+        self._sel.register(self._wake_r, selectors.EVENT_READ, None)
+        self._closed = False
+        self._thread = threading.Thread(target=self._loop, name="ping-coproc", daemon=True)
+        self._thread.start()
+
+    def __len__(self) -> int:
+        return len(self._procs)
+
+    def submit(self, ip: str, interval_s: float, timeout_ms: int = 1000) -> Optional[Future]:
+        """Future of the target's next ``(online, ms)``, or None to probe some other way."""
+        if not self.available or self._closed:
+            return None
+        now = self.clock()
+        with self._lock:
+            cp = self._procs.get(ip)
+            if cp is not None and cp.interval != interval_s:
+                self._kill(cp); cp = None  # cadence changed: start over with the new one
+            if cp is None:
+                if len(self._procs) >= self.max_procs:
+                    return None
+                cp = self._procs[ip] = _Coproc(ip, interval_s, timeout_ms, now)
+                self._wake()
+                return None
+            cp.used = now
+            if cp.proc is None:
+                return None
+            if cp.fresh and now - cp.sample_at <= timeout_ms/1000.0:
+                cp.fresh = False
+                return _done(cp.sample)
+            cp.fresh = False  # too old to stand for this probe
+            if not cp.sample[0]:
+                return None
+            fut: Future = Future()
+            cp.waiters.append((now + cp.interval + timeout_ms/1000.0, fut))
+            return fut
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            for cp in self._procs.values():
+                self._kill(cp)
+            self._procs.clear()
+        self._wake()
+        self._thread.join(timeout=2.0)
+
+    def _wake(self):
+        try:
+            os.write(self._wake_w, b"\0")
+        except OSError:
+            pass
+
+    def _loop(self):
+        try:
+            while not self._closed:
+                for key, _ in self._sel.select(timeout=0.5):
+                    if key.data is None:
+                        os.read(self._wake_r, 4096)
+                    else:
+                        self._read(key.data)
+                self._supervise(self.clock())
+        finally:
+            self._sel.close()
+            os.close(self._wake_r); os.close(self._wake_w)
+
+    def _read(self, cp: _Coproc):
+        try:
+            chunk = os.read(cp.proc.stdout.fileno(), 4096) if cp.proc is not None else b""
+        except OSError:
+            chunk = b""
+        with self._lock:
+            if not chunk:
+                self._exited(cp); return
+            cp.buf += chunk
+            *lines, cp.buf = cp.buf.split(b"\n")
+            for line in lines:
+                sample = _parse_line(line.decode("utf-8", "ignore"))
+                if sample is None:
+                    continue
+                if sample[0]:
+                    cp.restarts = 0
+                cp.sample = sample; cp.sample_at = self.clock()
+                if cp.waiters:
+                    for _, fut in cp.waiters:
+                        _resolve(fut, sample)
+                    cp.waiters = []; cp.fresh = False
+                else:
+                    cp.fresh = True
+
+    def _supervise(self, now: float):
+        with self._lock:
+            for ip, cp in list(self._procs.items()):
+                if now - cp.used > max(self.idle_s, 3 * cp.interval):
+                    self._kill(cp); del self._procs[ip]; continue
+                if cp.waiters:
+                    late = [w for w in cp.waiters if w[0] <= now]
+                    if late:
+                        cp.waiters = [w for w in cp.waiters if w[0] > now]
+                        for _, fut in late:
+                            _resolve(fut, (False, 0))
+                if cp.proc is None and now >= cp.start_at:
+                    self._start(cp, now)
+
+    def _start(self, cp: _Coproc, now: float):
+        try:
+            cp.proc = subprocess.Popen(_coproc_cmd(cp.ip, cp.interval, cp.timeout_ms), stdin=subprocess.DEVNULL,
+                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       env={**os.environ, "LC_ALL": "C"})
+        except OSError:
+            self.available = False  # no ping binary: everybody falls back for good
+            return
+        cp.buf = b""; cp.fresh = False
+        self._sel.register(cp.proc.stdout, selectors.EVENT_READ, cp)
+
+    def _exited(self, cp: _Coproc):
+        """EOF on a child's stdout (lock held): schedule a restart, fail its waiters."""
+        self._kill(cp)
+        cp.restarts += 1
+        cp.start_at = self.clock() + min(self.max_restart_s, 2.0 ** cp.restarts)
+        cp.sample = (False, 0)
+
+    def _kill(self, cp: _Coproc):
+        proc, cp.proc = cp.proc, None
+        for _, fut in cp.waiters:
+            _resolve(fut, (False, 0))
+        cp.waiters = []; cp.fresh = False
+        if proc is None:
+            return
+        try:
+            self._sel.unregister(proc.stdout)
+        except (KeyError, ValueError):
+            pass
+        try:
+            proc.kill(); proc.wait(timeout=1.0)
+        except Exception:
+            pass
+        proc.stdout.close()
@@ -0,0 +1,151 @@
+from __future__ import annotations
+import errno, heapq, itertools, selectors, socket, threading, time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+PROBE_TYPES = ["icmp", "tcp", "udp"]
+
+# Payloads that make common UDP services answer; anything else gets a single NUL byte
+_UDP_PAYLOADS = {
+    5060: (b"OPTIONS sip:ping@ipmonitor SIP/2.0\r\nVia: SIP/2.0/UDP 0.0.0.0;branch=z9hG4bK-ipmon\r\n"
+           b"Max-Forwards: 0\r\nFrom: <sip:ipmonitor@ipmonitor>;tag=ipmon\r\nTo: <sip:ping@ipmonitor>\r\n"
+           b"Call-ID: ipmon-probe\r\nCSeq: 1 OPTIONS\r\nContent-Length: 0\r\n\r\n"),
+    123: b"\x1b" + bytes(47),  # NTP client request
+}
+
+def parse_probe(spec: str) -> Tuple[str, int]:
+    """``"icmp"``, ``"tcp:554"`` or ``"udp:5060"`` -> (kind, port); unknown specs fall back to icmp."""
+    kind, _, port = (spec or "icmp").strip().lower().partition(":")
+    if kind in ("tcp", "tcp-connect", "udp"):
+        try:
+            p = int(port)
+        except ValueError:
+            return "icmp", 0
+        if 0 < p < 65536:
+            return ("udp" if kind == "udp" else "tcp"), p
+    return "icmp", 0
+
+def format_probe(kind: str, port: int = 0) -> str:
+    return f"{kind}:{port}" if kind in ("tcp", "udp") and port else "icmp"
+
+class _Check:
+    __slots__ = ("sock", "kind", "deadline", "started", "future", "seq")
+
+    def __init__(self, sock: socket.socket, kind: str, deadline: float, seq: int, future: Future):
+        self.sock = sock; self.kind = kind; self.deadline = deadline; self.seq = seq
+        self.started = time.perf_counter(); self.future = future
+
+class PortProber:
+    """Runs many non-blocking TCP connects / UDP requests through one ``selectors`` loop.
+
+    ``submit`` returns a Future resolving to ``(online, ms)`` where ms is the connect
+    (or request/response) round trip. A TCP check succeeds only on a completed
+    handshake; a UDP check succeeds on any reply datagram.
+    """
+
+    def __init__(self):
+        self._sel = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False); self._wake_w.setblocking(False)
+        self._sel.register(self._wake_r, selectors.EVENT_READ, None)
+        self._lock = threading.Lock()
+        self._incoming: List[Tuple[str, str, int, int, Future]] = []
+        self._active: Dict[int, _Check] = {}
+        self._expiry: List[Tuple[float, int]] = []
+        self._seq = itertools.count(1)
+        self._closed = False
+        self._thread = threading.Thread(target=self._loop, name="port-probe", daemon=True)
+        self._thread.start()
+
+    def submit(self, ip: str, kind: str, port: int, timeout_ms: int = 1000) -> Future:
+        fut: Future = Future()
+        with self._lock:
+            if self._closed:
+                fut.set_result((False, 0)); return fut
+            self._incoming.append((ip, kind, port, timeout_ms, fut))
+        try: self._wake_w.send(b"\0")
+        except OSError: pass
+        return fut
+
+    def close(self):
+        self._closed = True
+        try: self._wake_w.send(b"\0")
+        except OSError: pass
+        self._thread.join(1.0)
+
+    def _start(self, ip: str, kind: str, port: int, timeout_ms: int, fut: Future):
+        family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+        try:
+            sock = socket.socket(family, socket.SOCK_DGRAM if kind == "udp" else socket.SOCK_STREAM)
+        except OSError:
+            fut.set_result((False, 0)); return
+        sock.setblocking(False)
+        chk = _Check(sock, kind, time.monotonic() + timeout_ms/1000.0, next(self._seq), fut)
+        try:
+            if kind == "udp":
+                sock.connect((ip, port))  # connected UDP surfaces ICMP port-unreachable as ECONNREFUSED
+                sock.send(_UDP_PAYLOADS.get(port, b"\0"))
+                self._sel.register(sock, selectors.EVENT_READ, chk)
+            else:
+                rc = sock.connect_ex((ip, port))
+                if rc not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, getattr(errno, "WSAEWOULDBLOCK", -1)):
+                    sock.close(); fut.set_result((False, 0)); return
+                self._sel.register(sock, selectors.EVENT_WRITE, chk)
+        except OSError:
+            sock.close(); fut.set_result((False, 0)); return
+        self._active[chk.seq] = chk
+        heapq.heappush(self._expiry, (chk.deadline, chk.seq))
+
+    def _finish(self, chk: _Check, ok: bool):
+        ms = max(1, int((time.perf_counter() - chk.started) * 1000)) if ok else 0
+        self._active.pop(chk.seq, None)
+        try: self._sel.unregister(chk.sock)
+        except (KeyError, ValueError): pass
+        chk.sock.close()
+        if not chk.future.done():
+            chk.future.set_result((ok, ms))
+
+    def _loop(self):
+        while not self._closed:
+            with self._lock:
+                incoming, self._incoming = self._incoming, []
+            for args in incoming:
+                self._start(*args)
+            timeout = max(0.0, self._expiry[0][0] - time.monotonic()) if self._expiry else None
+            for key, _ev in self._sel.select(timeout):
+                chk = key.data
+                if chk is None:
+                    try: self._wake_r.recv(4096)
+                    except OSError: pass
+                    continue
+                if chk.kind == "udp":
+                    try:
+                        chk.sock.recv(2048); ok = True
+                    except OSError:
+                        ok = False
+                else:
+                    ok = chk.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0
+                self._finish(chk, ok)
+            now = time.monotonic()
+            while self._expiry and self._expiry[0][0] <= now:
+                _, seq = heapq.heappop(self._expiry)
+                chk = self._active.get(seq)
+                if chk is not None:
+                    self._finish(chk, False)
+        for chk in list(self._active.values()):
+            self._finish(chk, False)
+        with self._lock:
+            leftover, self._incoming = self._incoming, []
+        for *_a, fut in leftover:
+            if not fut.done(): fut.set_result((False, 0))
+        self._sel.close(); self._wake_r.close(); self._wake_w.close()
+
+_shared: Optional[PortProber] = None
+_shared_lock = threading.Lock()
+
+def get_port_prober() -> PortProber:
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = PortProber()
+    return _shared
@@ -0,0 +1,98 @@
+from __future__ import annotations
+import ipaddress, socket, threading, time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+try:
+    import dns.resolver as _dns  # dnspython: gives us the record TTL
+except Exception:
+    _dns = None  # type: ignore
+
+def is_address(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+def _done(value) -> Future:
+    fut: Future = Future()
+    fut.set_result(value)
+    return fut
+
+class Resolver:
+    """Process-wide DNS cache shared by every probe.
+
+    ``resolve`` never blocks: a fresh entry comes back as a finished Future, a missing
+    one starts a single background lookup that all callers share, and an expired one
+    is served stale while it refreshes. Positive answers live for the record TTL
+    (``dnspython`` when installed, else ``ttl_s``), failures for ``negative_ttl_s``.
+    """
+
+    def __init__(self, ttl_s: float = 300.0, negative_ttl_s: float = 30.0, min_ttl_s: float = 5.0,
+                 workers: int = 4, clock=time.monotonic):
+        self.ttl_s = ttl_s
+        self.negative_ttl_s = negative_ttl_s
+        self.min_ttl_s = min_ttl_s
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Tuple[Optional[str], float]] = {}  # host -> (address or None, expires)
+        self._pending: Dict[str, Future] = {}
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dns")
+
+    def resolve(self, host: str) -> Future:
+        """Future of the host's address, or None when it does not resolve."""
+        if is_address(host):
+            return _done(host)
+        now = self.clock()
+        with self._lock:
+            hit = self._cache.get(host)
+            if hit is not None and hit[1] > now:
+                return _done(hit[0])
+            fut = self._pending.get(host)
+            if fut is None:
+                fut = self._pending[host] = Future()
+                self._pool.submit(self._lookup, host, fut)
+        if hit is not None and hit[0] is not None:
+            return _done(hit[0])  # stale but usable while the refresh runs
+        return fut
+
+    def cached(self, host: str) -> Optional[str]:
+        if is_address(host):
+            return host
+        with self._lock:
+            hit = self._cache.get(host)
+        return hit[0] if hit else None
+
+    def _lookup(self, host: str, fut: Future):
+        try:
+            addr, ttl = self._query(host)
+        except Exception:
+            addr, ttl = None, 0.0
+        with self._lock:
+            self._cache[host] = (addr, self.clock() + (max(self.min_ttl_s, ttl) if addr else self.negative_ttl_s))
+            self._pending.pop(host, None)
+        fut.set_result(addr)
+
+    def _query(self, host: str) -> Tuple[Optional[str], float]:
+        if _dns is not None:
+            try:
+                ans = _dns.resolve(host, "A")
+                return ans[0].address, float(ans.rrset.ttl)
+            except Exception:
+                pass  # AAAA-only names, /etc/hosts entries, ...: ask the system resolver
+        try:
+            infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        except OSError:
+            return None, 0.0
+        infos.sort(key=lambda i: i[0] != socket.AF_INET)  # prefer IPv4, the native ICMP socket is v4 only
+        return (infos[0][4][0], self.ttl_s) if infos else (None, 0.0)
+
+_shared: Optional[Resolver] = None
+_shared_lock = threading.Lock()
+
+def get_resolver() -> Resolver:
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = Resolver()
+    return _shared
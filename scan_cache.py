@@ -0,0 +1,83 @@
+from __future__ import annotations
+import json, os, threading, time
+from typing import Dict, List, Optional, Tuple
+from scheduler import subnet_of
+
+CHANGE_NEW = "new"
+CHANGE_GONE = "gone"
+CHANGE_MAC = "mac"
+
+class ScanCache:
+    """What earlier sweeps saw, per subnet: ``{subnet: {ip: {mac, seen, ms, live, changed}}}``.
+
+    ``compare`` classifies a fresh answer against the stored one (new host, host gone,
+    MAC changed) before ``record`` stores it; ``hot`` lists the addresses worth a
+    quick rescan: those live at the last sweep or changed within ``recent_s``.
+    """
+
+    def __init__(self, path: str, recent_s: float = 7 * 86400.0):
+        self.path = path
+        self.recent_s = recent_s
+        self._lock = threading.Lock()
+        self._subnets: Dict[str, Dict[str, dict]] = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, dict]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self._subnets.values())
+
+    def get(self, ip: str) -> Optional[dict]:
+        return self._subnets.get(subnet_of(ip), {}).get(ip)
+
+    def compare(self, ip: str, online: bool, mac: str) -> Tuple[str, str]:
+        """``(change, previous MAC)``; change is "" when nothing differs from the last sweep."""
+        entry = self.get(ip)
+        if entry is None or not entry.get("live"):
+            return (CHANGE_NEW, "") if online else ("", "")
+        old_mac = entry.get("mac", "")
+        if not online:
+            return CHANGE_GONE, old_mac
+        if mac and old_mac and mac != old_mac:
+            return CHANGE_MAC, old_mac
+        return "", old_mac
+
+    def record(self, ip: str, online: bool, mac: str, ms: int, change: str = "", now: Optional[float] = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            subnet = subnet_of(ip)
+            entry = self._subnets.get(subnet, {}).get(ip)
+            if entry is None:
+                if not online:
+                    return  # never seen: not worth remembering
+                entry = self._subnets.setdefault(subnet, {})[ip] = {}
+            entry["live"] = bool(online)
+            if online:
+                entry["seen"] = int(now); entry["ms"] = int(ms)
+                if mac:
+                    entry["mac"] = mac
+            if change:
+                entry["changed"] = int(now)
+
+    def hot(self, contains=None, now: Optional[float] = None) -> List[str]:
+        """Addresses to rescan first (optionally only those ``contains(ip)`` accepts)."""
+        now = time.time() if now is None else now
+        with self._lock:
+            ips = [ip for hosts in self._subnets.values() for ip, e in hosts.items()
+                   if e.get("live") or now - e.get("changed", 0) < self.recent_s]
+        return [ip for ip in ips if contains is None or contains(ip)]
+
+    def save(self):
+        with self._lock:
+            data = json.dumps(self._subnets, ensure_ascii=False, indent=1, sort_keys=True)
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, self.path)
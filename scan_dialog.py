@@ -1,11 +1,18 @@
 from __future__ import annotations
-import ipaddress, subprocess, sys, re
+import os, queue, time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import List, Set, Optional
+from typing import Dict, List, Set, Optional, Tuple
 from PyQt6.QtCore import Qt, QThread, pyqtSignal, QObject
 from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton,
-    QSpinBox, QTableWidget, QTableWidgetItem, QHeaderView, QMessageBox, QCheckBox, QComboBox)
+    QSpinBox, QTableView, QHeaderView, QMessageBox, QCheckBox, QComboBox)
 from ping_worker import ping_once
+from icmp_echo import get_icmp_socket
+from neighbors import get_neighbor_table
+from scan_targets import ScanCheckpoint, ScanTargets
+from scan_cache import ScanCache
+from tables import ScanFilterProxy, ScanTableModel
 from app_lists import DEFAULT_GROUPS, DEFAULT_DIVISIONS
 
 @dataclass
@@ -19,67 +26,116 @@ class ScanItem:
     group: str = ''
     division: str = ''
     name: str = ''
-
-def _get_mac(ip: str) -> str:
-    try:
-        if sys.platform.startswith("win"):
-            out = subprocess.run(["arp","-a", ip], capture_output=True, text=True, encoding="mbcs", errors="ignore", timeout=2)
-            m = re.search(r"([0-9a-fA-F]{2}(?:-[0-9a-fA-F]{2}){5})", out.stdout or "")
-            return m.group(1).lower() if m else ""
-        else:
-            out = subprocess.run(["arp","-n", ip], capture_output=True, text=True, encoding="utf-8", errors="ignore", timeout=2)
-            m = re.search(r"([0-9a-fA-F]{2}(?::[0-9a-fA-F]{2}){5})", out.stdout or "")
-            return m.group(1).lower() if m else ""
-    except Exception:
-        return ""
-
-def _ip_range(start_ip: str, end_ip: str) -> List[str]:
-    s = ipaddress.ip_address(start_ip); e = ipaddress.ip_address(end_ip)
-    if int(e) < int(s): s, e = e, s
-    return [str(ipaddress.ip_address(v)) for v in range(int(s), int(e)+1)]
+    change: str = ''  # scan_cache.CHANGE_* against the previous sweep
+    old_mac: str = ''
 
 class ScanWorker(QThread):
+    """Sweeps ``targets`` from position ``start`` with up to ``parallel`` probes in flight.
+
+    Replies arrive in any order but results are still produced in address order, so
+    every address before the current position is done, which is what ``checkpoint``
+    records for a later resume. ``scanned_batch`` carries them at most once per
+    ``batch_ms``; online hosts whose MAC was not in the neighbor table yet are looked
+    up again after one fresh read just before their batch goes out. With a ``cache``
+    every item is then compared with the previous sweep and recorded; the cache is
+    saved when the sweep ends.
+    """
     progress = pyqtSignal(int, int)
-    scanned = pyqtSignal(int, object)
+    scanned_batch = pyqtSignal(list)  # [ScanItem, ...]
     finished_scan = pyqtSignal(int, int, int)
-    def __init__(self, ips: List[str], interval: int, existing_ips: Set[str], parent: Optional[QObject] = None):
-        super().__init__(parent); self.ips = ips; self.interval = interval; self.existing = existing_ips; self._running = False
+    def __init__(self, targets: ScanTargets, interval: int, existing_ips: Set[str], parent: Optional[QObject] = None,
+                 parallel: int = 64, timeout_ms: int = 1000, start: int = 0, checkpoint: Optional[ScanCheckpoint] = None,
+                 batch_ms: int = 100, cache: Optional[ScanCache] = None):
+        super().__init__(parent); self.targets = targets; self.interval = interval; self.existing = existing_ips; self._running = False
+        self.parallel = max(1, int(parallel)); self.timeout_ms = int(timeout_ms); self.start_at = int(start); self.checkpoint = checkpoint
+        self.batch_ms = int(batch_ms); self.cache = cache
     def stop(self): self._running = False
+    def _submit(self, pool: ThreadPoolExecutor, ip: str) -> Future:
+        icmp = get_icmp_socket()
+        if icmp is not None and icmp.supports(ip):
+            return icmp.submit(ip, self.timeout_ms)
+        return pool.submit(ping_once, ip, self.timeout_ms)
+    def _finish_batch(self, batch: List[ScanItem], macs):
+        missing = [it for it in batch if it.online and not it.mac]
+        if missing:  # they answered after the last table read
+            macs.refresh(any(":" in it.ip for it in missing))
+            for it in missing: it.mac = macs.lookup(it.ip)
+        if self.cache is not None:
+            for it in batch:
+                it.change, it.old_mac = self.cache.compare(it.ip, it.online, it.mac)
+                self.cache.record(it.ip, it.online, it.mac, it.ms, it.change)
+        self.scanned_batch.emit(batch)
     def run(self):
-        total=len(self.ips); done=0; on_count=0; exist_count=0; self._running=True
-        for i, ip in enumerate(self.ips):
-            if not self._running: break
-            online, ms = ping_once(ip, timeout_ms=1000)
-            mac = _get_mac(ip) if online else ""
-            exists = ip in self.existing
-            if online: on_count += 1
-            if exists: exist_count += 1
-            item = ScanItem(ip=ip, interval=self.interval, mac=mac, online=online, ms=ms, exists=exists)
-            self.scanned.emit(i, item); done += 1; self.progress.emit(done, total); self.msleep(10)
-        self.finished_scan.emit(total, on_count, exist_count)
+        total=self.targets.count; done=self.start_at; on_count=0; exist_count=0; self._running=True
+        replies: "queue.Queue" = queue.Queue(); ready: Dict[int, Tuple[str, Future]] = {}; in_flight = 0
+        targets = self.targets.iter_from(done); macs = get_neighbor_table()  # one table read per batch, not one arp per host
+        batch: List[ScanItem] = []; flush_at = time.monotonic() + self.batch_ms/1000.0
+        pool = ThreadPoolExecutor(max_workers=self.parallel, thread_name_prefix="scan")
+        try:
+            while self._running and done < total:
+                while in_flight < self.parallel:
+                    nxt = next(targets, None)
+                    if nxt is None: break
+                    i, ip = nxt; in_flight += 1
+                    self._submit(pool, ip).add_done_callback(lambda f, i=i, ip=ip: replies.put((i, ip, f)))
+                try: i, ip, fut = replies.get(timeout=0.2)
+                except queue.Empty: continue
+                in_flight -= 1; ready[i] = (ip, fut)
+                while done in ready and self._running:  # emit in address order
+                    ip, fut = ready.pop(done)
+                    try: online, ms = fut.result()
+                    except Exception: online, ms = False, 0
+                    mac = macs.lookup(ip) if online else ""
+                    exists = ip in self.existing
+                    if online: on_count += 1
+                    if exists: exist_count += 1
+                    item = ScanItem(ip=ip, interval=self.interval, mac=mac, online=online, ms=ms, exists=exists)
+                    batch.append(item); done += 1
+                    if self.checkpoint is not None: self.checkpoint.save(self.targets, done)
+                if batch and time.monotonic() >= flush_at:
+                    self._finish_batch(batch, macs); batch = []; self.progress.emit(done, total)
+                    flush_at = time.monotonic() + self.batch_ms/1000.0
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+            if batch: self._finish_batch(batch, macs); batch = []
+            if self.checkpoint is not None:
+                if done >= total: self.checkpoint.clear(self.targets)
+                else: self.checkpoint.save(self.targets, done, force=True)
+            if self.cache is not None:
+                try: self.cache.save()
+                except OSError: pass
+        self.progress.emit(done, total)
+        self.finished_scan.emit(done, on_count, exist_count)
 
 class ScanDialog(QDialog):
     devices_ready = pyqtSignal(list)
     device_added = pyqtSignal(dict)
     def __init__(self, existing_ips: Optional[Set[str]] = None, groups: Optional[List[str]] = None,
-                 divisions: Optional[List[str]] = None, parent=None):
+                 divisions: Optional[List[str]] = None, parent=None, checkpoint_path: str = os.path.join("logs", "scan_checkpoint.json"),
+                 cache_path: str = os.path.join("logs", "scan_cache.json")):
         super().__init__(parent)
+        self._checkpoint = ScanCheckpoint(checkpoint_path); self._cache = ScanCache(cache_path)
         self.setWindowTitle("IP diapazonini skanerlash"); self.resize(900,560)
-        self.existing_ips = existing_ips or set(); self._worker: Optional[ScanWorker] = None; self._results: List[ScanItem] = []
+        self.existing_ips = existing_ips or set(); self._worker: Optional[ScanWorker] = None
         self._groups = groups or DEFAULT_GROUPS; self._divisions = divisions or DEFAULT_DIVISIONS
 
         root = QVBoxLayout(self)
         top = QHBoxLayout(); root.addLayout(top)
-        top.addWidget(QLabel("Boshlang‘ich IP:")); self.ed_start = QLineEdit(self); self.ed_start.setPlaceholderText("192.168.1.1"); top.addWidget(self.ed_start,1)
-        top.addWidget(QLabel("Tugash IP:")); self.ed_end = QLineEdit(self); self.ed_end.setPlaceholderText("192.168.1.254"); top.addWidget(self.ed_end,1)
+        top.addWidget(QLabel("Manzillar:")); self.ed_start = QLineEdit(self); self.ed_start.setPlaceholderText("192.168.1.0/24, 10.0.0.1-50")
+        self.ed_start.setToolTip("CIDR, diapazon yoki IP; bir nechtasini vergul bilan ajrating"); top.addWidget(self.ed_start,2)
+        top.addWidget(QLabel("Tugash IP:")); self.ed_end = QLineEdit(self); self.ed_end.setPlaceholderText("ixtiyoriy"); top.addWidget(self.ed_end,1)
         top.addWidget(QLabel("Interval (s):")); self.sb_interval=QSpinBox(self); self.sb_interval.setRange(1,3600); self.sb_interval.setValue(30); top.addWidget(self.sb_interval)
+        top.addWidget(QLabel("Parallel:")); self.sb_parallel=QSpinBox(self); self.sb_parallel.setRange(1,1024); self.sb_parallel.setValue(64); self.sb_parallel.setToolTip("Bir vaqtda tekshiriladigan IP’lar soni"); top.addWidget(self.sb_parallel)
+        self.chk_rescan = QCheckBox("Faqat o‘zgarishlar"); self.chk_rescan.setToolTip("Oldingi skanerlashda tirik bo‘lgan yoki yaqinda o‘zgargan IP’larnigina qayta tekshirish"); top.addWidget(self.chk_rescan)
         self.btn_start=QPushButton("Skanerlash"); self.btn_stop=QPushButton("To‘xtatish"); self.btn_stop.setEnabled(False); top.addWidget(self.btn_start); top.addWidget(self.btn_stop)
 
         gp = QHBoxLayout(); root.addLayout(gp)
         gp.addWidget(QLabel("Guruh:")); self.cb_group=QComboBox(); self.cb_group.addItems(self._groups); gp.addWidget(self.cb_group)
         gp.addWidget(QLabel("Bo‘linma:")); self.cb_division=QComboBox(); self.cb_division.addItems(self._divisions); gp.addWidget(self.cb_division)
+        gp.addWidget(QLabel("Istisno:")); self.ed_exclude = QLineEdit(self); self.ed_exclude.setPlaceholderText("192.168.1.1, 192.168.1.200-254"); gp.addWidget(self.ed_exclude,1)
 
-        self.tbl = QTableWidget(0,6, self); self.tbl.setHorizontalHeaderLabels(["t/r","IP","Interval","MAC","Holati","Ping (ms)"])
+        self.model = ScanTableModel(); self.proxy = ScanFilterProxy(); self.proxy.setSourceModel(self.model)
+        self.tbl = QTableView(self); self.tbl.setModel(self.proxy); self.tbl.verticalHeader().setVisible(False)
         self.tbl.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents)
         self.tbl.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
         for c in (2,3,4,5): self.tbl.horizontalHeader().setSectionResizeMode(c, QHeaderView.ResizeMode.ResizeToContents)
@@ -88,6 +144,9 @@ class ScanDialog(QDialog):
 
         bottom=QHBoxLayout(); root.addLayout(bottom)
         self.chk_skip_existing = QCheckBox("Mavjud IP’larni o‘tkazib yuborish"); self.chk_skip_existing.setChecked(True); bottom.addWidget(self.chk_skip_existing); bottom.addStretch(1)
+        self.chk_skip_existing.toggled.connect(self.proxy.setSkipExisting)
+        self.chk_only_changes = QCheckBox("Faqat farqlar (yangi / yo‘qolgan / MAC)"); bottom.insertWidget(1, self.chk_only_changes)
+        self.chk_only_changes.toggled.connect(self.proxy.setOnlyChanges)
         self.btn_add_one=QPushButton("Bittalab qo‘shish"); self.btn_add_selected=QPushButton("Tanlanganlarni qo‘shish"); self.btn_add_all=QPushButton("Barchasini qo‘shish"); self.btn_cancel=QPushButton("Yopish")
         for b in (self.btn_add_one,self.btn_add_selected,self.btn_add_all,self.btn_cancel): bottom.addWidget(b)
 
@@ -97,17 +156,30 @@ class ScanDialog(QDialog):
         self.btn_add_selected.clicked.connect(self._do_add_selected); self.btn_add_all.clicked.connect(self._do_add_all); self.btn_add_one.clicked.connect(self._do_add_one); self.btn_cancel.clicked.connect(self.reject)
 
     def _start_scan(self):
-        start_ip=self.ed_start.text().strip(); end_ip=self.ed_end.text().strip()
-        if not start_ip or not end_ip: QMessageBox.warning(self, "Xatolik", "Boshlang‘ich va tugash IP’larni kiriting."); return
-        try: ips=_ip_range(start_ip, end_ip)
-        except Exception: QMessageBox.critical(self, "Xatolik", "IP diapazon noto‘g‘ri."); return
-        if len(ips)>4096:
-            ret=QMessageBox.question(self,"Ogohlantirish",f"{len(ips)} ta IP skan qilinadi. Davom etamizmi?",QMessageBox.StandardButton.Yes|QMessageBox.StandardButton.No)
-            if ret!=QMessageBox.StandardButton.Yes: return
-        self.tbl.setRowCount(0); self._results=[]; interval=int(self.sb_interval.value())
-        self._worker=ScanWorker(ips=ips, interval=interval, existing_ips=self.existing_ips, parent=self)
-        self._worker.progress.connect(self._on_progress); self._worker.scanned.connect(self._on_scanned); self._worker.finished_scan.connect(self._on_finished)
-        self.btn_start.setEnabled(False); self.btn_stop.setEnabled(True); self.lbl_info.setText("Skanerlash boshlandi…"); self._worker.start()
+        spec=self.ed_start.text().strip(); end_ip=self.ed_end.text().strip()
+        if not spec: QMessageBox.warning(self, "Xatolik", "Skanerlanadigan manzillarni kiriting."); return
+        if end_ip: spec=f"{spec}-{end_ip}"
+        try: targets=ScanTargets(spec, self.ed_exclude.text())
+        except ValueError: QMessageBox.critical(self, "Xatolik", "IP diapazon noto‘g‘ri."); return
+        if not targets.count: QMessageBox.information(self, "Ma’lumot", "Istisnolardan keyin skanerlanadigan IP qolmadi."); return
+        if self.chk_rescan.isChecked():
+            hot=self._cache.hot(targets.__contains__)
+            if not hot: QMessageBox.information(self, "Ma’lumot", "Bu diapazon uchun oldingi skanerlash natijalari yo‘q. To‘liq skanerlang."); return
+            targets=ScanTargets(", ".join(hot)); start=0; checkpoint=None
+        else:
+            if targets.count>1<<24: QMessageBox.critical(self, "Xatolik", f"{targets.count} ta IP juda ko‘p."); return
+            if targets.count>4096:
+                ret=QMessageBox.question(self,"Ogohlantirish",f"{targets.count} ta IP skan qilinadi. Davom etamizmi?",QMessageBox.StandardButton.Yes|QMessageBox.StandardButton.No)
+                if ret!=QMessageBox.StandardButton.Yes: return
+            start=self._checkpoint.load(targets); checkpoint=self._checkpoint
+            if start:
+                ret=QMessageBox.question(self,"Davom ettirish",f"Oldingi skanerlash {start}/{targets.count} da to‘xtagan. Shu joydan davom ettirilsinmi?",QMessageBox.StandardButton.Yes|QMessageBox.StandardButton.No)
+                if ret!=QMessageBox.StandardButton.Yes: start=0
+        self.model.clear(); interval=int(self.sb_interval.value())
+        self._worker=ScanWorker(targets=targets, interval=interval, existing_ips=self.existing_ips, parent=self, parallel=int(self.sb_parallel.value()),
+                                start=start, checkpoint=checkpoint, cache=self._cache)
+        self._worker.progress.connect(self._on_progress); self._worker.scanned_batch.connect(self.model.add_items); self._worker.finished_scan.connect(self._on_finished)
+        self.btn_start.setEnabled(False); self.btn_stop.setEnabled(True); self.lbl_info.setText("Skanerlash davom etmoqda…" if start else "Skanerlash boshlandi…"); self._worker.start()
 
     def _stop_scan(self):
         if self._worker and self._worker.isRunning(): self._worker.stop()
@@ -116,25 +188,19 @@ class ScanDialog(QDialog):
     def _on_progress(self, done: int, total: int):
         self.lbl_info.setText(f"Skanerlash: {done}/{total} …")
 
-    def _on_scanned(self, index: int, item: ScanItem):
-        if self.chk_skip_existing.isChecked() and item.exists:
-            self._results.append(item); return
-        self._results.append(item); r=self.tbl.rowCount(); self.tbl.insertRow(r); self.tbl.setItem(r,0,QTableWidgetItem(str(r+1)))
-        ip_it=QTableWidgetItem(item.ip); self.tbl.setItem(r,1,ip_it)
-        self.tbl.setItem(r,2,QTableWidgetItem(str(item.interval))); self.tbl.setItem(r,3,QTableWidgetItem(item.mac or ""))
-        st_it=QTableWidgetItem("Online" if item.online else "Offline"); self.tbl.setItem(r,4,st_it)
-        self.tbl.setItem(r,5,QTableWidgetItem(str(item.ms if item.online else "")))
-
     def _on_finished(self,total:int,on_count:int,exist_count:int):
         self.btn_stop.setEnabled(False); self.btn_start.setEnabled(True)
-        self.lbl_info.setText(f"Jami {total} ta IP skanerlandi, {on_count} ta Online. {exist_count} tasi ro‘yxatda mavjud.")
+        diff=Counter(it.change for it in self.model.items if it.change)
+        msg=f"Jami {total} ta IP skanerlandi, {on_count} ta Online. {exist_count} tasi ro‘yxatda mavjud."
+        if diff: msg+=f" Farqlar: {diff['new']} yangi, {diff['gone']} yo‘qolgan, {diff['mac']} MAC o‘zgargan."
+        self.lbl_info.setText(msg)
 
     def _filtered_results_for_add(self, only_selected: bool) -> List[ScanItem]:
         res: List[ScanItem] = []; sel_group=self.cb_group.currentText(); sel_div=self.cb_division.currentText()
         if only_selected:
-            rows={i.row() for i in self.tbl.selectedIndexes()}; to_iter=[(r,self._results[r]) for r in sorted(rows) if 0 <= r < len(self._results)]
+            to_iter=[(r,self.model.items[r]) for r in self._selected_rows()]
         else:
-            to_iter=list(enumerate(self._results))
+            to_iter=list(enumerate(self.model.items))
         for r,it in to_iter:
             if self.chk_skip_existing.isChecked() and it.exists: continue
             it.group=sel_group; it.division=sel_div; 
@@ -142,6 +208,10 @@ class ScanDialog(QDialog):
             res.append(it)
         return res
 
+    def _selected_rows(self) -> List[int]:
+        """Selected rows as indexes into ``self.model.items``."""
+        return sorted({self.proxy.mapToSource(i).row() for i in self.tbl.selectionModel().selectedRows()})
+
     def _do_add_selected(self):
         if self._worker and self._worker.isRunning(): QMessageBox.information(self, "Ma’lumot", "Iltimos, skanerlash tugashini kuting yoki to‘xtating."); return
         devices=self._filtered_results_for_add(True)
@@ -156,11 +226,11 @@ class ScanDialog(QDialog):
 
     def _do_add_one(self):
         if self._worker and self._worker.isRunning(): QMessageBox.information(self, "Ma’lumot", "Iltimos, skanerlash tugashini kuting yoki to‘xtating."); return
-        rows=sorted({i.row() for i in self.tbl.selectedIndexes()})
+        rows=self._selected_rows()
         if not rows: QMessageBox.information(self,"Ma’lumot","Avval bitta qatorni tanlang."); return
         r=rows[0]
-        if not (0 <= r < len(self._results)): return
-        it=self._results[r]
+        if not (0 <= r < len(self.model.items)): return
+        it=self.model.items[r]
         if it.exists and self.chk_skip_existing.isChecked(): QMessageBox.information(self,"Ma’lumot","Ushbu IP allaqachon ro‘yxatda bor."); return
         # Bitta qurilmani qo‘shish — sodda: bevosita dictionary
         dev = {"group": self.cb_group.currentText(), "division": self.cb_division.currentText(), "name": f"Device {it.ip}",
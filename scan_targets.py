@@ -0,0 +1,140 @@
+from __future__ import annotations
+import hashlib, ipaddress, json, os, re, time
+from typing import Iterator, List, Tuple
+
+Span = Tuple[int, int, int]  # (first, last, ip version), inclusive
+
+def _parse_span(token: str) -> Span:
+    """``10.0.0.0/24``, ``10.0.0.5-10.0.0.40``, ``10.0.0.5-40`` or a single address."""
+    if "/" in token:
+        net = ipaddress.ip_network(token, strict=False)
+        return int(net.network_address), int(net.broadcast_address), net.version
+    if "-" in token:
+        a, b = (t.strip() for t in token.split("-", 1))
+        first = ipaddress.ip_address(a)
+        if re.fullmatch(r"\d{1,3}", b) and first.version == 4:  # short form: last octet only
+            b = a.rsplit(".", 1)[0] + "." + b
+        last = ipaddress.ip_address(b)
+        if first.version != last.version:
+            raise ValueError(f"mixed IP versions: {token}")
+        lo, hi = sorted((int(first), int(last)))
+        return lo, hi, first.version
+    addr = ipaddress.ip_address(token)
+    return int(addr), int(addr), addr.version
+
+def _parse_spans(spec: str) -> List[Span]:
+    spec = re.sub(r"\s*-\s*", "-", spec.strip())  # "a - b" is one range, not three tokens
+    return [_parse_span(t) for t in re.split(r"[,;\s]+", spec) if t]
+
+def _merge(spans: List[Span]) -> List[Span]:
+    out: List[Span] = []
+    for lo, hi, v in sorted(spans, key=lambda s: (s[2], s[0])):
+        if out and out[-1][2] == v and lo <= out[-1][1] + 1:
+            out[-1] = (out[-1][0], max(out[-1][1], hi), v)
+        else:
+            out.append((lo, hi, v))
+    return out
+
+def _subtract(spans: List[Span], holes: List[Span]) -> List[Span]:
+    out: List[Span] = []
+    for lo, hi, v in spans:
+        for hlo, hhi, hv in holes:
+            if hv != v or hhi < lo or hlo > hi:
+                continue
+            if hlo > lo:
+                out.append((lo, hlo - 1, v))
+            lo = hhi + 1
+            if lo > hi:
+                break
+        if lo <= hi:
+            out.append((lo, hi, v))
+    return out
+
+class ScanTargets:
+    """Addresses to sweep, kept as merged integer spans and produced lazily.
+
+    ``spec`` and ``exclude`` take CIDR blocks, ranges and single addresses separated by
+    commas or spaces; ``count`` is known up front, but no address string exists until
+    ``iter_from`` yields it, so a /16 costs a handful of tuples instead of 65k strings.
+    """
+
+    def __init__(self, spec: str, exclude: str = ""):
+        self.spec = spec.strip(); self.exclude = exclude.strip()
+        self.spans = _subtract(_merge(_parse_spans(spec)), _merge(_parse_spans(exclude)))
+        self.count = sum(hi - lo + 1 for lo, hi, _ in self.spans)
+
+    @property
+    def key(self) -> str:
+        """Stable identity of the address set, for checkpoints."""
+        return hashlib.sha1(repr(self.spans).encode("ascii")).hexdigest()[:16]
+
+    def iter_from(self, pos: int = 0) -> Iterator[Tuple[int, str]]:
+        """``(index, ip)`` for every address from position ``pos`` on."""
+        index = 0
+        for lo, hi, v in self.spans:
+            size = hi - lo + 1
+            if pos >= index + size:
+                index += size; continue
+            cls = ipaddress.IPv4Address if v == 4 else ipaddress.IPv6Address
+            for n in range(lo + max(0, pos - index), hi + 1):
+                yield index + n - lo, str(cls(n))
+            index += size
+
+    def __contains__(self, ip: object) -> bool:
+        try:
+            addr = ipaddress.ip_address(ip)  # type: ignore[arg-type]
+        except ValueError:
+            return False
+        n = int(addr)
+        return any(lo <= n <= hi for lo, hi, v in self.spans if v == addr.version)
+
+    def __iter__(self) -> Iterator[str]:
+        return (ip for _, ip in self.iter_from(0))
+
+class ScanCheckpoint:
+    """Last contiguous scan position per address set, in one small JSON file.
+
+    Written every ``every_s`` seconds while a sweep runs, so a stopped or crashed
+    sweep resumes from ``load`` instead of the first address.
+    """
+
+    def __init__(self, path: str, every_s: float = 2.0):
+        self.path = path
+        self.every_s = every_s
+        self._saved = 0.0
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def load(self, targets: ScanTargets) -> int:
+        entry = self._read().get(targets.key) or {}
+        pos = int(entry.get("pos", 0))
+        return pos if 0 < pos < targets.count else 0
+
+    def save(self, targets: ScanTargets, pos: int, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._saved < self.every_s:
+            return
+        self._saved = now
+        data = self._read()
+        data[targets.key] = {"spec": targets.spec, "exclude": targets.exclude, "pos": pos,
+                             "total": targets.count, "ts": int(time.time())}
+        self._write(data)
+
+    def clear(self, targets: ScanTargets):
+        data = self._read()
+        if data.pop(targets.key, None) is not None:
+            self._write(data)
+
+    def _write(self, data: dict):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
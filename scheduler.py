@@ -0,0 +1,365 @@
+from __future__ import annotations
+import heapq, ipaddress, itertools, time, zlib
+from collections import Counter, OrderedDict, deque
+from functools import lru_cache
+from typing import Deque, Dict, List, Optional, Set, Tuple
+from data_model import DeviceJob
+
+_ALERT_LANE = "\0alert"  # ready queue served ahead of the groups when prioritize_alerts is on
+_LOOKAHEAD = 64  # how far past a subnet-capped head a lane is searched
+
+def initial_phase(job: DeviceJob) -> float:
+    """Stable offset in [0, interval) so devices do not all fire in the first cycle."""
+    frac = (zlib.crc32(f"{job.ip}#{job.device_id}".encode("utf-8")) & 0xFFFFFFFF) / 2**32
+    return frac * max(1, job.interval)
+
+@lru_cache(maxsize=65536)
+def subnet_of(ip: str, prefix_v4: int = 24, prefix_v6: int = 64) -> str:
+    """Network an address belongs to for per-subnet caps; non-addresses stand alone."""
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        return ip
+    return str(ipaddress.ip_network(f"{ip}/{prefix_v4 if addr.version == 4 else prefix_v6}", strict=False))
+
+class _JobState:
+    __slots__ = ("srtt", "rttvar", "fails", "dispatched", "next_due", "version", "in_flight", "down", "parked", "subnet")
+
+    def __init__(self):
+        self.srtt = 0.0; self.rttvar = 0.0; self.fails = 0
+        self.dispatched = 0.0; self.next_due = 0.0; self.version = 0; self.in_flight = False
+        self.down = False; self.parked = False; self.subnet = ""
+
+class ProbeScheduler:
+    """Jobs ordered by next due time in a heap.
+
+    ``pop_due`` hands out only the jobs whose deadline has passed, so callers can sleep
+    until ``next_due()`` instead of scanning every job. A dispatched job is not requeued
+    until ``complete`` is called, which keeps one probe per job in flight. Heap entries
+    are invalidated lazily through a per-job version counter.
+
+    ``complete`` also feeds the probe outcome back: RTT samples drive a TCP-style
+    SRTT/RTTVAR estimate (RFC 6298) from which ``timeout_ms`` derives a per-job timeout,
+    and consecutive failures stretch the interval exponentially up to ``max_backoff_s``.
+
+    Jobs may name a ``parent`` (gateway/switch). While a parent is down its children
+    are parked: they leave the heap, are reported once through ``take_unreachable``
+    and resume as soon as the parent answers again. Parents that live elsewhere (another
+    shard) are fed in with ``set_parent_state``.
+
+    Due jobs wait in one ready queue per ``DeviceJob.group`` and are dispatched round
+    robin, so a large group cannot starve a small one. ``rate_limit`` (probes/s, a
+    token bucket holding ``rate_burst`` tokens) bounds the global probe rate,
+    ``subnet_cap`` bounds concurrent probes per /24 (/64), and ``prioritize_alerts``
+    serves ``alert`` jobs first.
+
+    When a job that is still confirmed up (``up``) fails a probe, it is requeued after
+    ``confirm_interval_s`` instead of its interval, for up to ``confirm_probes`` failures,
+    so the hysteresis confirms an outage in seconds while healthy jobs keep their cadence.
+    """
+
+    def __init__(self, jobs: Optional[List[DeviceJob]] = None, stagger: bool = True, clock=time.monotonic,
+                 min_timeout_ms: int = 250, max_timeout_ms: int = 1000,
+                 backoff_factor: float = 2.0, max_backoff_s: int = 300,
+                 rate_limit: float = 0.0, rate_burst: float = 0.0, subnet_cap: int = 0, prioritize_alerts: bool = False,
+                 confirm_interval_s: float = 2.0, confirm_probes: int = 3):
+        self.stagger = stagger
+        self.clock = clock
+        self.min_timeout_ms = int(min_timeout_ms)
+        self.max_timeout_ms = max(self.min_timeout_ms, int(max_timeout_ms))
+        self.backoff_factor = max(1.0, float(backoff_factor))
+        self.max_backoff_s = int(max_backoff_s)
+        self.rate_limit = max(0.0, float(rate_limit))
+        self.rate_burst = max(1.0, float(rate_burst or self.rate_limit))
+        self.subnet_cap = max(0, int(subnet_cap))
+        self.prioritize_alerts = bool(prioritize_alerts)
+        self.confirm_interval_s = max(0.0, float(confirm_interval_s))
+        self.confirm_probes = max(0, int(confirm_probes))
+        self._tokens = self.rate_burst
+        self._refilled = clock()
+        self._lanes: "OrderedDict[str, Deque[Tuple[float, int, str]]]" = OrderedDict()
+        self._subnet_load: Counter = Counter()
+        self._heap: List[Tuple[float, int, str]] = []  # (due, version, device_id)
+        self._jobs: Dict[str, DeviceJob] = {}
+        self._state: Dict[str, _JobState] = {}
+        self._in_flight = 0
+        self._versions = itertools.count(1)  # global, so a re-added id never matches stale entries
+        self._children: Dict[str, Set[str]] = {}
+        self._external_down: Set[str] = set()
+        self._unreachable: List[str] = []
+        if jobs:
+            self.set_jobs(jobs)
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def set_jobs(self, jobs: List[DeviceJob]):
+        wanted = {j.device_id: j for j in jobs}
+        for key in [k for k in self._jobs if k not in wanted]:
+            self.remove(key)
+        for job in wanted.values():
+            self.upsert(job)
+
+    def upsert(self, job: DeviceJob, now: Optional[float] = None):
+        """Add a job or apply an edit in O(log n), keeping its phase and RTT history."""
+        key = job.device_id
+        old = self._jobs.get(key)
+        if old == job:
+            return
+        now = self.clock() if now is None else now
+        self._jobs[key] = job
+        if old is None or old.parent != job.parent:
+            if old is not None and old.parent:
+                self._children.get(old.parent, set()).discard(key)
+            if job.parent:
+                self._children.setdefault(job.parent, set()).add(key)
+        if old is None:
+            st = self._state[key] = _JobState()
+            if key in self._external_down:  # it moved here from another shard while down
+                self._external_down.discard(key); st.down = True
+            if self._parent_down(job):
+                self._park(key, job.parent)
+            else:
+                self._push(key, now + (initial_phase(job) if self.stagger else 0.0))
+            return
+        st = self._state[key]
+        if old.ip != job.ip or old.probe != job.probe:
+            st.srtt = st.rttvar = 0.0; st.fails = 0  # new target: forget its RTT history
+        if st.parked and not self._parent_down(job):
+            self._unpark(key, now); return
+        if not st.parked and self._parent_down(job):
+            self._park(key, job.parent); return
+        if not st.in_flight and not st.parked:
+            self._push(key, min(st.next_due, now + max(1, job.interval)))
+
+    def remove(self, device_id: str):
+        job = self._jobs.pop(device_id, None)
+        st = self._state.pop(device_id, None)
+        if st is not None and st.in_flight:
+            self._release(st)
+        if job is not None and job.parent:
+            self._children.get(job.parent, set()).discard(device_id)
+        self._unpark_children(device_id, self.clock())
+
+    def set_parent_state(self, parent_id: str, down: bool, now: Optional[float] = None):
+        """Report the state of a parent that is not one of our jobs."""
+        if parent_id in self._jobs or down == (parent_id in self._external_down):
+            return
+        if down:
+            self._external_down.add(parent_id)
+            for child in list(self._children.get(parent_id, ())):
+                self._park(child, parent_id)
+        else:
+            self._external_down.discard(parent_id)
+            self._unpark_children(parent_id, self.clock() if now is None else now)
+
+    def take_unreachable(self) -> List[str]:
+        """Jobs parked since the last call, each reported once per outage."""
+        out, self._unreachable = self._unreachable, []
+        return [k for k in out if k in self._state and self._state[k].parked]
+
+    def __contains__(self, device_id: str) -> bool:
+        return device_id in self._jobs
+
+    def next_due(self) -> Optional[float]:
+        """Next heap deadline, or when the rate budget frees a token for a waiting job."""
+        nxt = None
+        while self._heap:
+            due, ver, key = self._heap[0]
+            st = self._state.get(key)
+            if st is not None and st.version == ver and not st.in_flight:
+                nxt = due; break
+            heapq.heappop(self._heap)
+        cost = self._blocked_cost() if self._lanes and self.rate_limit else None
+        if cost is not None and self._tokens < cost:
+            token_at = self._refilled + (cost - self._tokens) / self.rate_limit
+            nxt = token_at if nxt is None else min(nxt, token_at)
+        return nxt
+
+    def _blocked_cost(self) -> Optional[float]:
+        """Token cost of the job ``_dispatch`` would send next; None when every lane waits on a subnet."""
+        lanes = sorted(self._lanes, key=lambda l: l != _ALERT_LANE)
+        for lane in lanes:
+            q = self._lanes[lane]
+            for i in range(min(len(q), _LOOKAHEAD)):
+                _due, ver, key = q[i]
+                st = self._state.get(key)
+                if st is None or st.version != ver or st.in_flight or st.parked:
+                    continue
+                if self.subnet_cap and self._subnet_load[subnet_of(self._jobs[key].ip)] >= self.subnet_cap:
+                    continue  # waits for a completion, not for tokens
+                return min(self.rate_burst, max(1, self._jobs[key].packets))
+        return None
+
+    def pop_due(self, now: Optional[float] = None, limit: Optional[int] = None) -> List[DeviceJob]:
+        now = self.clock() if now is None else now
+        while self._heap:
+            due, ver, key = self._heap[0]
+            st = self._state.get(key)
+            if st is None or st.version != ver or st.in_flight:
+                heapq.heappop(self._heap); continue
+            if due > now:
+                break
+            heapq.heappop(self._heap)
+            job = self._jobs[key]
+            lane = _ALERT_LANE if self.prioritize_alerts and job.alert else job.group
+            self._lanes.setdefault(lane, deque()).append((due, ver, key))
+        return self._dispatch(now, limit)
+
+    def _dispatch(self, now: float, limit: Optional[int]) -> List[DeviceJob]:
+        """Round robin over the ready lanes within the rate budget and subnet caps."""
+        if self.rate_limit:
+            self._tokens = min(self.rate_burst, self._tokens + (now - self._refilled) * self.rate_limit)
+        self._refilled = now
+        out: List[DeviceJob] = []
+        held: Set[str] = set()  # lanes whose head waits for a subnet slot
+        while limit is None or len(out) < limit:
+            lane = next((l for l in self._lanes if l not in held), None)
+            if lane is None:
+                break
+            if _ALERT_LANE in self._lanes and _ALERT_LANE not in held:
+                lane = _ALERT_LANE
+            q = self._lanes[lane]
+            due, ver, key = q[0]
+            st = self._state.get(key)
+            if st is None or st.version != ver or st.in_flight or st.parked:
+                self._take(lane, q); continue
+            pos = 0
+            if self.subnet_cap and self._subnet_load[subnet_of(self._jobs[key].ip)] >= self.subnet_cap:
+                # Head waits for its subnet: let a job on another subnet in this lane go first
+                pos = next((i for i in range(1, min(len(q), _LOOKAHEAD)) if self._ready_for_subnet(q[i])), 0)
+                if not pos:
+                    held.add(lane); continue
+                due, ver, key = q[pos]; st = self._state[key]
+            job = self._jobs[key]
+            subnet = subnet_of(job.ip)
+            cost = min(self.rate_burst, max(1, job.packets))
+            if self.rate_limit and self._tokens < cost:
+                break
+            self._take(lane, q, pos)
+            if self.rate_limit:
+                self._tokens -= cost
+            if lane in self._lanes:
+                self._lanes.move_to_end(lane)
+            st.in_flight = True; st.dispatched = due; st.subnet = subnet
+            self._in_flight += 1; self._subnet_load[subnet] += 1
+            out.append(job)
+        return out
+
+    def _ready_for_subnet(self, entry: Tuple[float, int, str]) -> bool:
+        _due, ver, key = entry
+        st = self._state.get(key)
+        return (st is not None and st.version == ver and not st.in_flight and not st.parked
+                and self._subnet_load[subnet_of(self._jobs[key].ip)] < self.subnet_cap)
+
+    def _take(self, lane: str, q: Deque[Tuple[float, int, str]], pos: int = 0):
+        if pos:
+            del q[pos]
+        else:
+            q.popleft()
+        if not q:
+            del self._lanes[lane]
+
+    def _release(self, st: _JobState):
+        st.in_flight = False; self._in_flight -= 1
+        self._subnet_load[st.subnet] -= 1
+        if self._subnet_load[st.subnet] <= 0:
+            del self._subnet_load[st.subnet]
+
+    def complete(self, job: DeviceJob, ok: Optional[bool] = None, ms: int = 0, now: Optional[float] = None,
+                 up: Optional[bool] = None) -> bool:
+        """Requeue a finished probe; False when the result should not be reported (job parked or gone).
+
+        ``ok`` is the raw answer (RTT, backoff); ``up`` is the confirmed state after
+        hysteresis, which decides when children are parked. It defaults to ``ok``.
+        """
+        st = self._state.get(job.device_id)
+        if st is None or not st.in_flight:
+            return False
+        self._release(st)
+        if st.parked:
+            return False  # the parent went down while this probe was out
+        now = self.clock() if now is None else now
+        up = ok if up is None else up
+        if ok:
+            self._sample(st, ms); st.fails = 0
+        elif ok is not None:
+            st.fails += 1
+        if up:
+            if st.down:
+                st.down = False; self._unpark_children(job.device_id, now)
+        elif up is not None:
+            if not st.down:
+                st.down = True
+                for child in list(self._children.get(job.device_id, ())):
+                    self._park(child, job.device_id)
+        if ok is False and up and st.fails <= self.confirm_probes and self.confirm_interval_s < job.interval:
+            self._push(job.device_id, now + self.confirm_interval_s)  # confirm the outage quickly
+            return True
+        interval = self.effective_interval(job)
+        # Keep the original cadence unless we fell more than one interval behind
+        due = st.dispatched + interval
+        self._push(job.device_id, due if due >= now else now + (0.0 if now - st.dispatched < 2*interval else interval))
+        return True
+
+    def effective_interval(self, job: DeviceJob) -> float:
+        st = self._state.get(job.device_id)
+        base = max(1, job.interval)
+        if st is None or st.fails < 2:
+            return base
+        return min(max(base, self.max_backoff_s), base * self.backoff_factor ** (st.fails - 1))
+
+    def timeout_ms(self, job: DeviceJob) -> int:
+        """RTO = SRTT + 4*RTTVAR clamped to [min, max]; full timeout until measured or after a loss."""
+        st = self._state.get(job.device_id)
+        if st is None or st.srtt <= 0.0 or st.fails:
+            return self.max_timeout_ms
+        rto = st.srtt + max(10.0, 4.0 * st.rttvar)
+        return int(min(self.max_timeout_ms, max(self.min_timeout_ms, rto)))
+
+    def _parent_down(self, job: DeviceJob) -> bool:
+        ps = self._state.get(job.parent) if job.parent else None
+        if ps is None:
+            return job.parent in self._external_down
+        return ps.down or ps.parked
+
+    def _park(self, key: str, origin: str):
+        st = self._state.get(key)
+        if st is None or st.parked or key == origin:
+            return
+        st.parked = True; st.down = True
+        st.version = next(self._versions)  # drop its heap entry
+        self._unreachable.append(key)
+        for child in list(self._children.get(key, ())):
+            if child != origin:
+                self._park(child, origin)
+
+    def _unpark(self, key: str, now: float):
+        st = self._state.get(key)
+        if st is None or not st.parked:
+            return
+        st.parked = False
+        if not st.in_flight:
+            self._push(key, now)  # probe right away; its own children wait for that answer
+
+    def _unpark_children(self, key: str, now: float):
+        for child in list(self._children.get(key, ())):
+            self._unpark(child, now)
+
+    @staticmethod
+    def _sample(st: _JobState, ms: int):
+        r = float(max(1, ms))
+        if st.srtt <= 0.0:
+            st.srtt = r; st.rttvar = r / 2.0
+        else:
+            st.rttvar = 0.75 * st.rttvar + 0.25 * abs(st.srtt - r)
+            st.srtt = 0.875 * st.srtt + 0.125 * r
+
+    def _push(self, key: str, due: float):
+        st = self._state[key]
+        st.version = next(self._versions); st.next_due = due
+        heapq.heappush(self._heap, (due, st.version, key))
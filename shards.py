@@ -0,0 +1,254 @@
+from __future__ import annotations
+import multiprocessing as mp
+import os, queue, signal, threading, time, zlib
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+from data_model import DeviceJob, ProbeResult
+from engine import ProbeEngine
+from async_engine import AsyncProbeEngine
+
+ENGINES = {"thread": ProbeEngine, "asyncio": AsyncProbeEngine}
+
+def _shard_main(cmd_q, out_q, engine: str, max_in_flight: Optional[int], batch_ms: int, sched_options: dict,
+                damping_options: dict):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the coordinator decides when to stop
+    eng = ENGINES[engine](None, max_in_flight, batch_ms, on_batch=out_q.put)
+    eng.sched_options = dict(sched_options)
+    eng.damping_options = dict(damping_options)
+
+    def commands():
+        while True:
+            cmd, arg = cmd_q.get()
+            if cmd == "stop":
+                eng.stop(); return
+            if cmd == "upsert":
+                for job in arg: eng.update_job(job)
+            elif cmd == "remove":
+                for device_id in arg: eng.remove_job(device_id)
+            elif cmd == "parent":
+                for parent_id, down in arg: eng.set_parent_state(parent_id, down)
+    threading.Thread(target=commands, name="shard-cmd", daemon=True).start()
+    eng.run()
+
+class ShardedEngine:
+    """Spreads jobs over ``shards`` worker processes, each running its own engine.
+
+    Jobs are placed by CRC32 of their IP, so every device on one address shares a
+    shard. When adds or removes leave a shard more than ``slack`` above the average
+    load, whole addresses are moved from the busiest shard to the idlest one. Shards
+    stream ``ProbeResult`` batches back over one queue, and ``run()``
+    forwards them to ``on_batch`` / ``on_result`` like ``ProbeEngine``. Parent state
+    changes seen in those results are broadcast so children on other shards are parked.
+    """
+
+    def __init__(self, jobs: List[DeviceJob] | None = None, max_in_flight: int | None = None, batch_ms: int = 200,
+                 on_batch: Optional[Callable[[list], None]] = None,
+                 on_result: Optional[Callable[[ProbeResult], None]] = None,
+                 shards: int | None = None, engine: str = "thread", slack: float = 0.25):
+        self.on_batch = on_batch
+        self.on_result = on_result
+        self.shards = max(1, int(shards or os.cpu_count() or 1))
+        self.engine = engine
+        self.max_in_flight = max_in_flight
+        self.batch_ms = int(batch_ms)
+        self.slack = float(slack)
+        self.sched_options: dict = {}
+        self.damping_options: dict = {}
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, DeviceJob] = {}
+        self._ip_shard: Dict[str, int] = {}
+        self._ip_jobs: Dict[str, Dict[str, DeviceJob]] = {}
+        self._load = [0] * self.shards
+        self._parents: Counter = Counter()  # parent id -> number of children
+        self._parent_down: Dict[str, bool] = {}
+        self._cmd_qs: list = []
+        self._running = False
+        for j in jobs or []:
+            self._place(j)
+
+    @property
+    def jobs(self) -> List[DeviceJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def shard_loads(self) -> List[int]:
+        with self._lock:
+            return list(self._load)
+
+    # job edits -------------------------------------------------------------
+    def set_jobs(self, jobs: List[DeviceJob]):
+        wanted = {j.device_id: j for j in jobs}
+        with self._lock:
+            gone = [k for k in self._jobs if k not in wanted]
+        for k in gone:
+            self.remove_job(k)
+        for j in wanted.values():
+            self.update_job(j)
+
+    def add_job(self, job: DeviceJob):
+        self.update_job(job)
+
+    def update_job(self, job: DeviceJob):
+        with self._lock:
+            old = self._jobs.get(job.device_id)
+            if old == job:
+                return
+            if old is not None and old.ip != job.ip:
+                self._send(self._unplace(old), "remove", [old.device_id])
+            shard = self._place(job)
+            self._send_jobs(shard, [job])
+            self._rebalance()
+
+    def remove_job(self, device_id: str):
+        with self._lock:
+            old = self._jobs.get(device_id)
+            if old is None:
+                return
+            self._send(self._unplace(old), "remove", [device_id])
+            self._rebalance()
+
+    def stop(self):
+        self._running = False
+        with self._lock:
+            for q in self._cmd_qs:
+                q.put(("stop", None))
+
+    # coordinator -----------------------------------------------------------
+    def run(self):
+        ctx = mp.get_context("spawn")
+        out_q = ctx.Queue()
+        procs = []
+        with self._lock:
+            self._running = True
+            self._cmd_qs = [ctx.Queue() for _ in range(self.shards)]
+            for i, q in enumerate(self._cmd_qs):
+                p = ctx.Process(target=_shard_main, name=f"ipmon-shard-{i}", daemon=True,
+                                args=(q, out_q, self.engine, self.max_in_flight, self.batch_ms, self._shard_options(),
+                                      self.damping_options))
+                p.start(); procs.append(p)
+            by_shard: Dict[int, List[DeviceJob]] = {}
+            for j in self._jobs.values():
+                by_shard.setdefault(self._ip_shard[j.ip], []).append(j)
+            for i, jobs in by_shard.items():
+                self._send_jobs(i, jobs)
+        try:
+            while self._running:
+                try:
+                    batch = out_q.get(timeout=0.5)
+                except queue.Empty:
+                    if not any(p.is_alive() for p in procs):
+                        break
+                    continue
+                # Coalesce whatever the other shards have ready into one delivery
+                while len(batch) < 10000:
+                    try: batch = batch + out_q.get_nowait()
+                    except queue.Empty: break
+                self._deliver(batch)
+        finally:
+            self.stop()
+            # Shards flush their last batch on stop: keep reading until they are gone
+            deadline = time.monotonic() + 2.0; tail: list = []
+            while any(p.is_alive() for p in procs) and time.monotonic() < deadline:
+                try: tail += out_q.get(timeout=0.1)
+                except queue.Empty: pass
+            for p in procs:
+                if p.is_alive(): p.terminate()
+                p.join(0.5)
+            while True:
+                try: tail += out_q.get_nowait()
+                except queue.Empty: break
+            if tail: self._deliver(tail)
+            with self._lock:
+                self._cmd_qs = []
+
+    def _shard_options(self) -> dict:
+        """Split the global probe budget evenly; subnet caps apply per shard."""
+        opts = dict(self.sched_options)
+        for k in ("rate_limit", "rate_burst"):
+            if opts.get(k):
+                opts[k] = max(0.1, float(opts[k]) / self.shards)
+        return opts
+
+    def _deliver(self, batch: list):
+        with self._lock:
+            batch = [r for r in batch if r.device_id in self._jobs]
+            changed = []
+            for r in batch:
+                if r.device_id in self._parents and self._parent_down.get(r.device_id, False) == r.online:
+                    self._parent_down[r.device_id] = not r.online; changed.append((r.device_id, not r.online))
+            if changed:
+                for i in range(self.shards): self._send(i, "parent", changed)
+        if not batch:
+            return
+        if self.batch_ms <= 0 and self.on_result is not None:
+            for r in batch: self.on_result(r)
+        elif self.on_batch is not None:
+            self.on_batch(batch)
+
+    # placement (call with self._lock held) ----------------------------------
+    def _send(self, shard: int, cmd: str, arg):
+        if self._cmd_qs:
+            self._cmd_qs[shard].put((cmd, arg))
+
+    def _send_jobs(self, shard: int, jobs: List[DeviceJob]):
+        self._send(shard, "upsert", jobs)
+        down = sorted({j.parent for j in jobs if self._parent_down.get(j.parent)})
+        if down:
+            self._send(shard, "parent", [(p, True) for p in down])
+
+    def _place(self, job: DeviceJob) -> int:
+        shard = self._ip_shard.get(job.ip)
+        if shard is None:
+            shard = (zlib.crc32(job.ip.encode("utf-8")) & 0xFFFFFFFF) % self.shards
+            self._ip_shard[job.ip] = shard
+        group = self._ip_jobs.setdefault(job.ip, {})
+        if job.device_id not in group:
+            self._load[shard] += 1
+        group[job.device_id] = job
+        old = self._jobs.get(job.device_id)
+        if old is not None and old.parent:
+            self._drop_parent(old.parent)
+        if job.parent:
+            self._parents[job.parent] += 1
+        self._jobs[job.device_id] = job
+        return shard
+
+    def _unplace(self, job: DeviceJob) -> int:
+        shard = self._ip_shard[job.ip]
+        if self._jobs.pop(job.device_id, None) is not None and job.parent:
+            self._drop_parent(job.parent)
+        group = self._ip_jobs.get(job.ip, {})
+        if group.pop(job.device_id, None) is not None:
+            self._load[shard] -= 1
+        if not group:
+            self._ip_jobs.pop(job.ip, None); self._ip_shard.pop(job.ip, None)
+        return shard
+
+    def _drop_parent(self, parent_id: str):
+        self._parents[parent_id] -= 1
+        if self._parents[parent_id] <= 0:
+            del self._parents[parent_id]; self._parent_down.pop(parent_id, None)
+
+    def _rebalance(self):
+        if self.shards < 2 or not self._jobs:
+            return
+        limit = len(self._jobs) / self.shards * (1.0 + self.slack) + 1
+        while True:
+            hi = max(range(self.shards), key=self._load.__getitem__)
+            lo = min(range(self.shards), key=self._load.__getitem__)
+            gap = self._load[hi] - self._load[lo]
+            if self._load[hi] <= limit or gap < 2:
+                return
+            # Move the largest address group that still narrows the gap
+            movable = [(len(g), ip) for ip, g in self._ip_jobs.items() if self._ip_shard[ip] == hi and len(g) <= gap // 2]
+            if not movable:
+                return
+            size, ip = max(movable)
+            jobs = list(self._ip_jobs[ip].values())
+            self._ip_shard[ip] = lo; self._load[hi] -= size; self._load[lo] += size
+            self._send(hi, "remove", [j.device_id for j in jobs])
+            self._send_jobs(lo, jobs)
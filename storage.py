@@ -11,6 +11,8 @@ def save_project_json(path: str, devices: List[Device]):
 def load_project_json(path: str) -> List[Device]:
     with open(path, 'r', encoding='utf-8') as f:
         arr = json.load(f)
+    if isinstance(arr, dict):  # autosave.json style: {"devices": [...]}
+        arr = arr.get("devices", [])
     devs: List[Device] = []
     for d in arr:
         devs.append(Device(**d))
@@ -1,10 +1,11 @@
 from __future__ import annotations
-from typing import List, Any
+from typing import Dict, List, Any, Optional
 from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
 from PyQt6.QtWidgets import QStyledItemDelegate, QStyleOptionProgressBar, QApplication
-from data_model import Device
+from data_model import Device, STATE_DEGRADED, STATE_FLAPPING, STATE_UNREACHABLE
 
-HEADERS = ["Guruh", "Bo‘linma", "Qurilma nomi", "IP manzili", "Holati", "Ping (ms)", "Progress"]
+HEADERS = ["Guruh", "Bo‘linma", "Qurilma nomi", "IP manzili", "Holati", "Ping (ms)", "Progress",
+           "Yo‘qotish (%)", "Jitter (ms)", "Min/O‘rt/Maks (ms)"]
 
 def ms_to_progress(ms: int) -> int:
     try:
@@ -16,21 +17,42 @@ class DeviceTableModel(QAbstractTableModel):
     def __init__(self, devices: List[Device]):
         super().__init__()
         self.devices = devices
+        self._rows: Dict[str, int] = {}
+        self.reindex()
 
     # helpers
+    def reindex(self):
+        self._rows = {d.id: i for i, d in enumerate(self.devices)}
+
+    def row_of(self, device_id: str) -> Optional[int]:
+        return self._rows.get(device_id)
+
+    def set_devices(self, devices: List[Device]):
+        self.beginResetModel()
+        self.devices[:] = devices
+        self.reindex()
+        self.endResetModel()
+
     def add_device(self, d: Device):
         self.beginInsertRows(QModelIndex(), len(self.devices), len(self.devices))
         self.devices.append(d)
+        self._rows[d.id] = len(self.devices) - 1
         self.endInsertRows()
 
     def update_row(self, row: int):
         if 0 <= row < len(self.devices):
             self.dataChanged.emit(self.index(row,0), self.index(row, self.columnCount()-1))
 
+    def update_rows(self, rows):
+        rows = [r for r in rows if 0 <= r < len(self.devices)]
+        if rows:
+            self.dataChanged.emit(self.index(min(rows),0), self.index(max(rows), self.columnCount()-1))
+
     def remove_row(self, row: int):
         if 0 <= row < len(self.devices):
             self.beginRemoveRows(QModelIndex(), row, row)
             self.devices.pop(row)
+            self.reindex()
             self.endRemoveRows()
 
     # Qt model
@@ -58,15 +80,30 @@ class DeviceTableModel(QAbstractTableModel):
             if c == 1: return d.division
             if c == 2: return d.name
             if c == 3: return d.ip
-            if c == 4: return "Online" if d.online else "Offline"
+            if c == 4:
+                if d.state == STATE_UNREACHABLE: return "Unreachable"
+                if d.state == STATE_FLAPPING: return "Flapping"
+                if d.state == STATE_DEGRADED and d.online: return "Degraded"
+                return "Online" if d.online else "Offline"
             if c == 5:
                 ms = getattr(d, "last_ms", 0) or 0
                 return ms if ms > 0 else ""
             if c == 6:
                 ms = getattr(d, "last_ms", 0) or 0
                 return ms_to_progress(ms) if ms > 0 else 0
+            if c >= 7 and d.packets <= 1:
+                return ""  # single-packet probes have no loss/jitter to show
+            if c == 7: return f"{d.loss:g}"
+            if c == 8: return f"{d.jitter:.1f}" if d.online else ""
+            if c == 9: return f"{d.rtt_min:g}/{d.rtt_avg:.1f}/{d.rtt_max:g}" if d.online else ""
+        if role == Qt.ItemDataRole.ToolTipRole and c == 4 and d.state == STATE_UNREACHABLE:
+            return "Unreachable (parent down)"
+        if role == Qt.ItemDataRole.ToolTipRole and c == 4 and d.state == STATE_FLAPPING:
+            return f"Flapping – holat o‘zgarishlari bostirilgan (oxirgi tasdiqlangan: {'Online' if d.online else 'Offline'})"
+        if role == Qt.ItemDataRole.ToolTipRole and c in (4, 5) and d.online and d.p50:
+            return f"p50 {d.p50:g} ms, p95 {d.p95:g} ms"
         if role == Qt.ItemDataRole.TextAlignmentRole:
-            if c in (1,3,5,6):
+            if c in (1,3,5,6,7,8,9):
                 return int(Qt.AlignmentFlag.AlignCenter)
         return None
 
@@ -95,12 +132,96 @@ class DeviceFilterProxy(QSortFilterProxyModel):
                 return False
         if self.group and self.group != "Barchasi" and grp != self.group:
             return False
-        if self.state == "Online" and state != "Online":
+        if self.state == "Online" and state not in ("Online", "Degraded"):
+            return False
+        if self.state in ("Degraded", "Flapping", "Unreachable") and state != self.state:
             return False
         if self.state == "Offline" and state != "Offline":
             return False
         return True
 
+SCAN_HEADERS = ["t/r", "IP", "Interval", "MAC", "Holati", "Ping (ms)", "O‘zgarish"]
+SCAN_CHANGES = {"new": "Yangi", "gone": "Yo‘qolgan", "mac": "MAC o‘zgardi"}
+
+class ScanTableModel(QAbstractTableModel):
+    """Scan results (``scan_dialog.ScanItem``), appended a batch at a time."""
+    def __init__(self):
+        super().__init__()
+        self.items: List[Any] = []
+
+    def clear(self):
+        self.beginResetModel()
+        self.items = []
+        self.endResetModel()
+
+    def add_items(self, items: List[Any]):
+        if not items:
+            return
+        first = len(self.items)
+        self.beginInsertRows(QModelIndex(), first, first + len(items) - 1)
+        self.items.extend(items)
+        self.endInsertRows()
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.items)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return len(SCAN_HEADERS)
+
+    def headerData(self, section: int, orientation, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            if 0 <= section < len(SCAN_HEADERS):
+                return SCAN_HEADERS[section]
+        return None
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+        r, c = index.row(), index.column()
+        if not (0 <= r < len(self.items)):
+            return None
+        it = self.items[r]
+        if role == Qt.ItemDataRole.DisplayRole:
+            if c == 0: return r + 1
+            if c == 1: return it.ip
+            if c == 2: return it.interval
+            if c == 3: return it.mac or ""
+            if c == 4: return "Online" if it.online else "Offline"
+            if c == 5: return it.ms if it.online else ""
+            if c == 6: return SCAN_CHANGES.get(it.change, "")
+        if role == Qt.ItemDataRole.ToolTipRole and c == 1 and it.exists:
+            return "Ro‘yxatda mavjud"
+        if role == Qt.ItemDataRole.ToolTipRole and c in (3, 6) and it.old_mac and it.change:
+            return f"Oldingi MAC: {it.old_mac}"
+        if role == Qt.ItemDataRole.TextAlignmentRole and c in (0, 2, 4, 5, 6):
+            return int(Qt.AlignmentFlag.AlignCenter)
+        return None
+
+class ScanFilterProxy(QSortFilterProxyModel):
+    """Hides results already in the device list while ``skip_existing`` is on, and
+    everything unchanged since the last sweep while ``only_changes`` is on."""
+    def __init__(self):
+        super().__init__()
+        self.skip_existing = True
+        self.only_changes = False
+
+    def setSkipExisting(self, on: bool):
+        self.skip_existing = bool(on)
+        self.invalidateFilter()
+
+    def setOnlyChanges(self, on: bool):
+        self.only_changes = bool(on)
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row: int, source_parent: QModelIndex) -> bool:
+        items = self.sourceModel().items
+        if not (0 <= source_row < len(items)):
+            return False
+        it = items[source_row]
+        if self.skip_existing and it.exists:
+            return False
+        return not (self.only_changes and not it.change)
+
 class ProgressDelegate(QStyledItemDelegate):
     def paint(self, painter, option, index):
         try:
@@ -0,0 +1,92 @@
+from __future__ import annotations
+from collections import Counter
+from dataclasses import replace
+from typing import Dict, List, Optional, Set
+from data_model import DeviceJob
+
+def target_key(job: DeviceJob) -> str:
+    """Jobs with the same key send identical probes, so one answer serves them all."""
+    return f"{job.probe}/{job.packets}@{job.ip}"
+
+class TargetTable:
+    """Collapses device jobs that probe the same target into one scheduler job.
+
+    The target job is keyed by ``target_key``, runs at the smallest interval of its
+    members and names its parent by the parent's target key (or the parent's device
+    id when that parent is probed elsewhere). Every edit returns the target keys whose
+    job must be re-read with ``target_job``; ``members`` fans a result back out.
+    """
+
+    def __init__(self):
+        self._jobs: Dict[str, DeviceJob] = {}
+        self._key_of: Dict[str, str] = {}
+        self._members: Dict[str, Set[str]] = {}
+        self._children: Dict[str, Set[str]] = {}  # parent device id -> child device ids
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def set_jobs(self, jobs: List[DeviceJob]) -> Set[str]:
+        wanted = {j.device_id: j for j in jobs}
+        touched: Set[str] = set()
+        for device_id in [k for k in self._jobs if k not in wanted]:
+            touched |= self.remove(device_id)
+        for job in wanted.values():
+            touched |= self.upsert(job)
+        return touched
+
+    def upsert(self, job: DeviceJob) -> Set[str]:
+        old = self._jobs.get(job.device_id)
+        if old == job:
+            return set()
+        touched = self.remove(job.device_id) if old is not None else set()
+        key = target_key(job)
+        self._jobs[job.device_id] = job
+        self._key_of[job.device_id] = key
+        self._members.setdefault(key, set()).add(job.device_id)
+        if job.parent:
+            self._children.setdefault(job.parent, set()).add(job.device_id)
+        touched.add(key)
+        touched |= self._child_keys(job.device_id)  # their parent key may have moved
+        return touched
+
+    def remove(self, device_id: str) -> Set[str]:
+        job = self._jobs.pop(device_id, None)
+        if job is None:
+            return set()
+        key = self._key_of.pop(device_id)
+        members = self._members.get(key, set())
+        members.discard(device_id)
+        if not members:
+            self._members.pop(key, None)
+        if job.parent:
+            kids = self._children.get(job.parent, set())
+            kids.discard(device_id)
+            if not kids:
+                self._children.pop(job.parent, None)
+        return {key} | self._child_keys(device_id)
+
+    def key_of(self, device_id: str) -> Optional[str]:
+        return self._key_of.get(device_id)
+
+    def target_jobs(self) -> List[DeviceJob]:
+        return [self.target_job(k) for k in self._members]
+
+    def members(self, key: str) -> List[str]:
+        return list(self._members.get(key, ()))
+
+    def target_job(self, key: str) -> Optional[DeviceJob]:
+        ids = self._members.get(key)
+        if not ids:
+            return None
+        jobs = [self._jobs[i] for i in sorted(ids)]
+        parents = Counter(p for p in (self._parent_key(j) for j in jobs) if p and p != key)
+        parent = parents.most_common(1)[0][0] if parents else ""
+        return replace(jobs[0], device_id=key, interval=min(max(1, j.interval) for j in jobs), parent=parent,
+                       alert=any(j.alert for j in jobs))
+
+    def _parent_key(self, job: DeviceJob) -> str:
+        return self._key_of.get(job.parent, job.parent) if job.parent else ""
+
+    def _child_keys(self, device_id: str) -> Set[str]:
+        return {self._key_of[c] for c in self._children.get(device_id, ()) if c in self._key_of}
@@ -35,13 +35,19 @@ _STRINGS = {
         "group_label": "Guruh:",
         "division_label": "Bo‘linma:",
         "device_name_label": "Qurilma nomi:",
-        "ip_label": "IP manzili:",
+        "ip_label": "IP manzili yoki host nomi:",
         "interval_label": "Ping interval (s):",
         "audio_alert_label": "Ovozli ogohlantirish",
+        "probe_label": "Tekshiruv turi:",
+        "port_label": "Port:",
+        "parent_label": "Ota qurilma (shlyuz/kommutator):",
+        "parent_auto": "Avtomatik (guruh/bo‘linma shlyuzi)",
+        "gateway_label": "Bu qurilma guruh/bo‘linma shlyuzi",
+        "packets_label": "Paketlar soni (yo‘qotish/jitter uchun):",
         "ok": "OK",
         "cancel": "Bekor",
         "error": "Xato",
-        "enter_valid_ip": "To‘g‘ri IP manzil kiriting!",
+        "enter_valid_ip": "To‘g‘ri IP manzil yoki host nomini kiriting!",
         "warning": "Ogohlantirish",
         "enter_device_name": "Qurilma nomini kiriting!",
     }